@@ -0,0 +1,203 @@
+import copy
+import functools
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from lrucache import LRUCache
+
+# Granularities offered by the converter chart (pandas period aliases)
+GRANULARITIES = ('W', 'M', 'Q', 'Y')
+
+# One range query: bucket labels (period end dates), bucket means and the min/max bucket
+RangeAggregate = namedtuple('RangeAggregate', ['labels', 'means', 'min_value', 'min_date', 'max_value', 'max_date'])
+
+
+# Period end dates for span consecutive periods from the given ordinal. Ranges repeat across
+# pairs and requests, and building them is a large part of a query, so they are memoized.
+@functools.lru_cache(maxsize=1024)
+def _bucket_labels(granularity, first, span):
+    labels = pd.period_range(pd.Period(ordinal=first, freq=granularity), periods=span, freq=granularity)
+    return labels.to_timestamp(how='end').normalize()
+
+
+# Range argmin/argmax over a fixed array in O(1) per query after O(n log n) preprocessing.
+# NaN entries never win.
+class SparseTable:
+    def __init__(self, values, op):
+        self.op = op
+        keyed = np.where(np.isnan(values), np.inf if op == 'min' else -np.inf, values)
+        self.keyed = keyed
+        self.levels = [np.arange(len(values))]
+        width = 1
+        while 2 * width <= len(values):
+            previous = self.levels[-1]
+            left, right = previous[:-width], previous[width:]
+            self.levels.append(self._pick(left, right))
+            width *= 2
+
+    # Index of the winner between two index arrays; ties keep the left (earlier) one
+    def _pick(self, left, right):
+        if self.op == 'min':
+            return np.where(self.keyed[right] < self.keyed[left], right, left)
+        return np.where(self.keyed[right] > self.keyed[left], right, left)
+
+    # Index of the min/max over [i, j), j > i
+    def query(self, i, j):
+        level = int(np.log2(j - i))
+        table = self.levels[level]
+        return int(self._pick(table[i:i + 1], table[j - (1 << level):j - (1 << level) + 1])[0])
+
+
+# Prefix sums, bucket boundaries and sparse tables for one currency pair.
+# The per-granularity parts are built the first time that granularity is asked for.
+# layouts may be shared between pairs over the same dates, so the bucket boundaries for a
+# granularity are worked out once rather than per pair.
+class PairAggregates:
+    def __init__(self, dates, ratio, layouts=None):
+        self.dates = dates
+        self._layouts = layouts if layouts is not None else {}
+        valid = ~np.isnan(ratio)
+        self.sums = np.concatenate(([0.0], np.cumsum(np.where(valid, ratio, 0.0))))
+        self.counts = np.concatenate(([0], np.cumsum(valid)))
+        self._buckets = {}
+
+    # Copy covering additional dates after the current last one. Prefix sums are continued and
+    # the bucket tables already built are redone from their last (possibly partial) bucket on.
+    def extended(self, dates, ratio):
+        result = copy.copy(self)
+        result.dates = self.dates.append(dates)
+        valid = ~np.isnan(ratio)
+        result.sums = np.concatenate((self.sums, self.sums[-1] + np.cumsum(np.where(valid, ratio, 0.0))))
+        result.counts = np.concatenate((self.counts, self.counts[-1] + np.cumsum(valid)))
+        result._buckets = {}
+        for granularity, (ordinals, starts, _, means, _, _) in self._buckets.items():
+            if len(starts):
+                first = starts[-1]
+                new_ordinals, new_starts = np.unique(pd.PeriodIndex(result.dates[first:], freq=granularity).asi8, return_index=True)
+                ordinals = np.concatenate((ordinals[:-1], new_ordinals))
+                starts = np.concatenate((starts[:-1], new_starts + first))
+                ends = np.append(starts[1:], len(result.dates))
+                means = np.concatenate((means[:-1], result._mean(starts[-len(new_starts):], ends[-len(new_starts):])))
+                result._buckets[granularity] = (ordinals, starts, ends, means, SparseTable(means, 'min'), SparseTable(means, 'max'))
+        return result
+
+    def _mean(self, lo, hi):
+        counts = self.counts[hi] - self.counts[lo]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, (self.sums[hi] - self.sums[lo]) / counts, np.nan)
+
+    def buckets(self, granularity):
+        if granularity not in self._buckets:
+            key = (granularity, len(self.dates))
+            if key not in self._layouts:
+                ordinals, starts = np.unique(pd.PeriodIndex(self.dates, freq=granularity).asi8, return_index=True)
+                self._layouts[key] = (ordinals, starts, np.append(starts[1:], len(self.dates)))
+            ordinals, starts, ends = self._layouts[key]
+            means = self._mean(starts, ends)
+            self._buckets[granularity] = (ordinals, starts, ends, means, SparseTable(means, 'min'), SparseTable(means, 'max'))
+        return self._buckets[granularity]
+
+    # Bucket means for sorted positions [i, j) at the given granularity, like
+    # resample(granularity).mean() on that slice, plus the min and max bucket
+    def query(self, i, j, granularity):
+        if j <= i:
+            return None
+
+        ordinals, starts, ends, means, min_table, max_table = self.buckets(granularity)
+        first = int(np.searchsorted(starts, i, side='right')) - 1
+        last = int(np.searchsorted(starts, j - 1, side='right')) - 1
+
+        # Edge buckets may be cut by the range; interior buckets are already averaged
+        lo = np.maximum(starts[first:last + 1], i)
+        hi = np.minimum(ends[first:last + 1], j)
+        range_means = self._mean(lo, hi)
+
+        # Periods with no rows at all still get a (NaN) point, as resample does
+        span = ordinals[last] - ordinals[first] + 1
+        series = np.full(span, np.nan)
+        series[ordinals[first:last + 1] - ordinals[first]] = range_means
+        labels = _bucket_labels(granularity, int(ordinals[first]), int(span))
+
+        # Min/max: cut edge buckets directly, interior from the sparse tables in O(1)
+        candidates = [first]
+        if last - first > 1:
+            candidates += [min_table.query(first + 1, last), max_table.query(first + 1, last)]
+        if last > first:
+            candidates.append(last)
+        candidates.sort()
+        values = np.array([range_means[c - first] for c in candidates])
+        if np.isnan(values).all():
+            return RangeAggregate(labels, series, np.nan, None, np.nan, None)
+
+        low = candidates[int(np.nanargmin(values))]
+        high = candidates[int(np.nanargmax(values))]
+        return RangeAggregate(labels, series,
+                              range_means[low - first], labels[ordinals[low] - ordinals[first]],
+                              range_means[high - first], labels[ordinals[high] - ordinals[first]])
+
+
+# Per-pair aggregates over a rate store, built lazily and kept in an LRU cache
+class AggregateIndex:
+    def __init__(self, rate_store, date_index, cache_size=64):
+        self.store = rate_store
+        self.date_index = date_index
+        self.cache = LRUCache(cache_size)
+        # Bucket boundaries per (granularity, number of dates), shared by every pair
+        self.layouts = {}
+
+    # Aggregates of the pair covering at least the dates of `index` (default: the current index)
+    def pair(self, currency_from, currency_to, index=None):
+        index = self.date_index.snapshot() if index is None else index
+        key = (self.store.registry.code(currency_from), self.store.registry.code(currency_to))
+        pair = self.cache.get_or_compute(key, lambda: self._build(*key, index))
+        # Built from an older index while rows were being added, so extend() passed it over
+        if len(pair.dates) < len(index):
+            pair = self._build(*key, index)
+            self.cache.put(key, pair)
+        return pair
+
+    def _ratio(self, currency_from, currency_to, rows):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = self.store.column(currency_to, rows) / self.store.column(currency_from, rows)
+        ratio[~np.isfinite(ratio)] = np.nan
+        return ratio
+
+    def _build(self, currency_from, currency_to, index):
+        return PairAggregates(pd.DatetimeIndex(index.dates), self._ratio(currency_from, currency_to, index.rows), self.layouts)
+
+    # dataset.on_append listener: extend the cached pairs by the dates added from first_position on
+    def extend(self, first_position, in_order):
+        if not in_order:
+            self.layouts = {}
+            self.cache.clear()
+            return
+        rows = self.date_index.rows[first_position:]
+        dates = pd.DatetimeIndex(self.date_index.dates[first_position:])
+        for (currency_from, currency_to), pair in self.cache.items():
+            # Pairs built after the rows arrived already cover them
+            if len(pair.dates) != first_position:
+                continue
+            ratio = self._ratio(currency_from, currency_to, rows)
+            self.cache.put((currency_from, currency_to), pair.extended(dates, ratio))
+
+    # Units of currency_to per one currency_from, averaged per bucket over [start, end]
+    def query(self, currency_from, currency_to, start, end, granularity):
+        index = self.date_index.snapshot()
+        i, j = index.range_positions(start, end)
+        return self.pair(currency_from, currency_to, index).query(i, j, granularity)
+
+
+# Same queries answered from a partitioned store: only the partitions overlapping the range are
+# read, and the pair's aggregates are built for that window alone
+class WindowedAggregates:
+    def __init__(self, partitioned_store):
+        self.store = partitioned_store
+
+    def query(self, currency_from, currency_to, start, end, granularity):
+        dates, values = self.store.read(start, end, [currency_from, currency_to])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = values[:, 1] / values[:, 0]
+        ratio[~np.isfinite(ratio)] = np.nan
+        return PairAggregates(pd.DatetimeIndex(dates), ratio).query(0, len(dates), granularity)
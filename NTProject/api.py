@@ -0,0 +1,204 @@
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from flask import Blueprint, jsonify, request
+
+import dataset
+from aggregates import GRANULARITIES
+from crossrates import cross_rate_rows
+from dataset import date_index, registry, store
+from dateindex import EXACT, LOOKUP_MODES
+from fxrate import fx_service
+from index import aggregate_index
+
+# Plain JSON endpoints on the Flask server behind the Dash app, for services that need the
+# rates without going through the UI. Register with server.register_blueprint(api).
+api = Blueprint('api', __name__, url_prefix='/api')
+
+# Seconds clients may reuse a response before revalidating it with If-None-Match
+MAX_AGE = int(os.environ.get('FX_API_MAX_AGE', 0))
+
+
+class BadRequest(ValueError):
+    pass
+
+
+@api.errorhandler(BadRequest)
+def _bad_request(error):
+    return jsonify(error=str(error)), 400
+
+
+def _mode():
+    mode = request.args.get('mode', EXACT)
+    if mode not in LOOKUP_MODES:
+        raise BadRequest(f"Unknown lookup mode '{mode}', expected one of {', '.join(LOOKUP_MODES)}.")
+    return mode
+
+
+def _currency(name):
+    currency = request.args.get(name)
+    if currency not in registry:
+        raise BadRequest(f"Unknown currency '{currency}'.")
+    return registry.code(currency)
+
+
+def _date(value, name='date'):
+    date = pd.to_datetime(value, errors='coerce')
+    if pd.isnull(date):
+        raise BadRequest(f"'{name}' must be a date such as 2020-01-31.")
+    return date
+
+
+# Every response is derived from the dataset alone, so its version is the ETag of every URL
+def _version():
+    tag, modified = dataset.version()
+    return tag, datetime.fromtimestamp(int(modified), timezone.utc)
+
+
+# True when a conditional GET already holds the current version. The tag is shared by every URL,
+# so this is checked once the parameters are validated, before any work is done.
+def _not_modified():
+    tag, modified = _version()
+    if request.if_none_match:
+        return request.if_none_match.contains(tag)
+    return request.if_modified_since is not None and request.if_modified_since >= modified
+
+
+def _cached(payload):
+    response = jsonify(payload)
+    tag, modified = _version()
+    response.set_etag(tag)
+    response.last_modified = modified
+    response.cache_control.public = True
+    response.cache_control.max_age = MAX_AGE
+    return response
+
+
+def _not_modified_response():
+    response = _cached({})
+    response.status_code = 304
+    response.set_data(b'')
+    return response
+
+
+# NaN -> null for JSON
+def _nullable(values):
+    values = np.asarray(values, dtype=object)
+    values[pd.isnull(values)] = None
+    return values.tolist()
+
+
+# GET /api/rates?base=USD&date=2020-01-31[&mode=previous]
+# Units of the base per one unit of every currency with a rate on that day
+@api.get('/rates')
+def rates():
+    base, requested, mode = _currency('base'), _date(request.args.get('date')), _mode()
+    if _not_modified():
+        return _not_modified_response()
+
+    rates_on_date, error = fx_service.get_fx_rates(base, requested, mode)
+    if error:
+        return jsonify(error=error), 404
+    _, rate_date = fx_service.resolve_date(requested, mode)
+    return _cached({'base': base, 'requested_date': requested.strftime('%Y-%m-%d'),
+                    'date': rate_date.strftime('%Y-%m-%d'), 'rates': rates_on_date})
+
+
+# GET /api/rates/batch?base=USD&date=2020-01-31&base=EUR&date=2021-06-30[&mode=previous]
+# POST /api/rates/batch {"requests": [{"base": "USD", "date": "2020-01-31"}, ...], "mode": "previous"}
+# All items are answered with one index lookup and one block of cross rates. Rates come back as
+# lists in the order of "currencies", null where missing.
+@api.route('/rates/batch', methods=['GET', 'POST'])
+def rates_batch():
+    if request.method == 'GET':
+        bases, dates, mode = request.args.getlist('base'), request.args.getlist('date'), _mode()
+        if len(bases) != len(dates):
+            raise BadRequest("Give one 'date' for every 'base'.")
+        if _not_modified():
+            return _not_modified_response()
+    else:
+        body = request.get_json(silent=True)
+        body = {} if body is None else body
+        if not isinstance(body, dict):
+            raise BadRequest("The body must be a JSON object such as {\"requests\": [...]}.")
+        items = body.get('requests', [])
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise BadRequest("'requests' must be a list of objects with 'base' and 'date'.")
+        bases, dates = [item.get('base') for item in items], [item.get('date') for item in items]
+        if not all(isinstance(value, str) for value in bases + dates):
+            raise BadRequest("Every request needs 'base' and 'date' as strings.")
+        mode = body.get('mode', EXACT)
+        if mode not in LOOKUP_MODES:
+            raise BadRequest(f"Unknown lookup mode '{mode}', expected one of {', '.join(LOOKUP_MODES)}.")
+
+    base_ids = np.array([registry.id(base) if base in registry else -1 for base in bases], dtype=np.intp)
+    requested = pd.to_datetime(pd.Series(dates, dtype=object), errors='coerce')
+    positions = date_index.lookup_many(requested, mode) if len(requested) else np.empty(0, dtype=np.intp)
+    found = (base_ids >= 0) & (positions >= 0)
+
+    block = cross_rate_rows(store.matrix(positions[found]), base_ids[found])
+    rows = iter(_nullable(block))
+    matched = iter(pd.DatetimeIndex(store.dates[positions[found]]).strftime('%Y-%m-%d'))
+
+    results = []
+    for base, date, base_id, ok in zip(bases, requested, base_ids, found):
+        result = {'base': registry.codes[base_id] if base_id >= 0 else base,
+                  'requested_date': None if pd.isnull(date) else date.strftime('%Y-%m-%d')}
+        if ok:
+            result.update(date=next(matched), rates=next(rows))
+        elif base_id < 0:
+            result['error'] = f"Unknown currency '{base}'."
+        else:
+            result['error'] = "No exchange rates found for that date."
+        results.append(result)
+
+    payload = {'currencies': registry.codes, 'results': results}
+    return _cached(payload) if request.method == 'GET' else jsonify(payload)
+
+
+# GET /api/convert?from=EUR&to=AUD&amount=100&start=2020-01-01&end=2020-12-31[&granularity=M]
+# amount of `from` in `to` for every day in the range, or per W/M/Q/Y bucket average together
+# with the lowest and highest bucket, as the converter chart shows
+@api.get('/convert')
+def convert():
+    currency_from, currency_to = _currency('from'), _currency('to')
+    try:
+        amount = float(request.args.get('amount', 1))
+    except ValueError:
+        raise BadRequest("'amount' must be a number.")
+    # NaN and infinity would come out as bare NaN/Infinity, which is not valid JSON; a negative
+    # amount would turn the lowest bucket into the highest. The converter page has the same rule.
+    if not np.isfinite(amount) or amount <= 0:
+        raise BadRequest("'amount' must be a positive number.")
+    start = _date(request.args['start'], 'start') if request.args.get('start') else None
+    end = _date(request.args['end'], 'end') if request.args.get('end') else None
+    granularity = request.args.get('granularity', 'D')
+    if granularity != 'D' and granularity not in GRANULARITIES:
+        raise BadRequest(f"Unknown granularity '{granularity}', expected D or one of {', '.join(GRANULARITIES)}.")
+    if _not_modified():
+        return _not_modified_response()
+
+    payload = {'from': currency_from, 'to': currency_to, 'amount': amount, 'granularity': granularity}
+    if granularity == 'D':
+        index = date_index.snapshot()
+        i, j = index.range_positions(start, end)
+        rows = index.range_rows(start, end)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = store.column(currency_to, rows) / store.column(currency_from, rows) * amount
+        values[~np.isfinite(values)] = np.nan
+        payload.update(dates=pd.DatetimeIndex(index.dates[i:j]).strftime('%Y-%m-%d').tolist(),
+                       values=_nullable(values))
+    else:
+        aggregate = aggregate_index.query(currency_from, currency_to, start, end, granularity)
+        if aggregate is None:
+            payload.update(dates=[], values=[], min=None, max=None)
+        else:
+            payload.update(dates=aggregate.labels.strftime('%Y-%m-%d').tolist(),
+                           values=_nullable(aggregate.means * amount),
+                           min=None if aggregate.min_date is None else
+                           {'date': aggregate.min_date.strftime('%Y-%m-%d'), 'value': aggregate.min_value * amount},
+                           max=None if aggregate.max_date is None else
+                           {'date': aggregate.max_date.strftime('%Y-%m-%d'), 'value': aggregate.max_value * amount})
+    return _cached(payload)
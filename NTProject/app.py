@@ -0,0 +1,66 @@
+import logging
+import os
+
+import dash
+from dash import Dash, dcc, html
+from flask import request
+
+# FX_LOG_LEVEL=DEBUG logs per-callback timings, lookups and data loading. Set up before the
+# pages are imported so loading the dataset is logged too.
+logging.basicConfig(level=os.environ.get('FX_LOG_LEVEL', 'WARNING').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+# Importing the pages registers their callbacks; the shared dataset loads on first use
+import cb
+import dataset
+import fxrate
+import index
+from api import api
+import metrics
+import warmup
+
+# One multi-page application serving every view.
+# Run with `python app.py`, or under gunicorn with `gunicorn -c gunicorn.conf.py app:server`.
+# The dataset is loaded in the background after the port is bound (see warmup.py).
+app = Dash(__name__, use_pages=True, pages_folder='')
+
+dash.register_page('converter', path='/', name='Currency Converter', layout=index.layout)
+dash.register_page('fx-rates', path='/fx-rates', name='FX Rate Converter', layout=fxrate.layout)
+dash.register_page('basket', path='/basket', name='Custom Currency Basket', layout=cb.layout)
+
+app.layout = html.Div([
+    html.Div([
+        dcc.Link(page['name'], href=page['relative_path'], style={'marginRight': '20px'})
+        for page in dash.page_registry.values()
+    ], style={'padding': '10px 20px', 'borderBottom': '1px solid #ddd'}),
+    dash.page_container
+])
+
+# WSGI entry point
+server = app.server
+
+# JSON rate API under /api, served by Flask directly
+server.register_blueprint(api)
+
+# Prometheus-style /metrics: callback latency and payload sizes, data loading, upstream quote
+# requests and cache hit rates. Each worker process reports its own counters.
+metrics.install(server)
+
+# /ready reports the background loading and precomputation of the default views
+warmup.install(server)
+
+
+# Dash callbacks, including the one rendering the pages, need the data; a request arriving before
+# the warm-up has loaded it waits for the load. Also picks up newly ingested daily rates (see
+# ingest.py) without restarting.
+@server.before_request
+def refresh_rates():
+    if request.path.endswith('/_dash-update-component'):
+        dataset.load()
+    dataset.refresh_if_due()
+
+if __name__ == '__main__':
+    # With the reloader only the child process marked by werkzeug serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warmup.start()
+    app.run_server(debug=True)
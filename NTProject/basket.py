@@ -0,0 +1,46 @@
+import numpy as np
+
+from crossrates import cross_rate_vector
+
+# A basket is a {currency code: amount} dict with any number of legs. Many baskets are
+# packed into one amount matrix (baskets x currencies) so that valuing all of them is a
+# single matrix-vector (live) or matrix-matrix (history) product.
+
+
+# Amount matrix for a list of baskets, columns following `codes`.
+# Repeated legs add up; legs whose code is not in `codes` are returned per basket.
+def build_amounts(baskets, codes):
+    column = {code: i for i, code in enumerate(codes)}
+    amounts = np.zeros((len(baskets), len(codes)))
+    unknown = []
+    for row, basket in enumerate(baskets):
+        unknown.append([code for code in basket if code not in column])
+        for code, amount in basket.items():
+            if code in column:
+                amounts[row, column[code]] += amount or 0
+    return amounts, unknown
+
+
+# Value of every basket given a vector of base-currency units per one unit of each currency.
+# Legs without a rate are left out and reported per basket.
+def value_baskets(amounts, rates, codes):
+    rates = np.asarray(rates, dtype=np.float64)
+    known = ~np.isnan(rates)
+    values = amounts[:, known] @ rates[known]
+
+    held_without_rate = (amounts != 0) & ~known
+    missing = [[codes[i] for i in np.flatnonzero(held)] for held in held_without_rate]
+    return values, missing
+
+
+# Value of every basket on every date in one pass.
+# per_pivot is the (dates x currencies) history quoted as units per one unit of the pivot;
+# the result is (dates x baskets), NaN on dates where a held leg or the base has no rate.
+def value_baskets_history(amounts, per_pivot, base_index):
+    rates = cross_rate_vector(per_pivot, base_index)
+    missing = np.isnan(rates)
+    values = np.where(missing, 0.0, rates) @ amounts.T
+
+    held = (amounts != 0).astype(np.float64)
+    values[(missing.astype(np.float64) @ held.T) > 0] = np.nan
+    return values
@@ -0,0 +1,239 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+# Reproducible performance benchmarks over synthetic rate tables shaped like the bundled
+# Combine_Exchange_Rate_Report (dates down, 'Name (ISO)' currency columns across, units per USD,
+# gaps where a currency was not quoted). Results are written as JSON for comparing commits:
+#   python benchmark.py --currencies 51 --years 11 --output before.json
+#   python benchmark.py --compare before.json --output after.json
+
+# Share of missing rates in the bundled report
+MISSING_SHARE = 0.15
+
+
+# Synthetic rate table: (dates, values with NaN gaps, 'Name (ISO)' headers). U.S. dollar is
+# the first column and always 1; the rest follow seeded geometric random walks.
+def synthetic_rates(currencies=51, years=11, frequency='B', seed=0, start='2012-01-02'):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, pd.Timestamp(start) + pd.DateOffset(years=years), freq=frequency, inclusive='left')
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    # Made-up ISO-style codes ZAA, ZAB, ... (up to 677 currencies)
+    codes = ['USD'] + [f'Z{letters[i // 26 % 26]}{letters[i % 26]}' for i in range(currencies - 1)]
+    headers = ['U.S. dollar (USD)'] + [f'Synthetic currency {i + 1} ({code})' for i, code in enumerate(codes[1:])]
+
+    levels = np.exp(rng.uniform(-3, 9, currencies))
+    steps = rng.normal(0, 0.006, (len(dates), currencies))
+    values = levels * np.exp(np.cumsum(steps, axis=0))
+    values[rng.random(values.shape) < MISSING_SHARE] = np.nan
+    values[:, 0] = 1.0
+    return dates.to_numpy(dtype='datetime64[ns]'), values, headers
+
+
+# Write the table in the report's layouts: XLSX, or CSV with dd-Mon-yy dates and a trailing comma
+def write_source(path, dates, values, headers):
+    frame = pd.DataFrame(values, columns=headers)
+    if path.endswith('.xlsx'):
+        frame.insert(0, 'Date', pd.DatetimeIndex(dates))
+        frame.to_excel(path, index=False)
+    else:
+        frame.insert(0, 'Date', pd.DatetimeIndex(dates).strftime('%d-%b-%y'))
+        frame[''] = np.nan
+        frame.to_csv(path, index=False)
+
+
+# Seconds per call over `repeat` rounds of `number` calls each
+def measure(function, repeat=5, number=1):
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - began) / number)
+    timings.sort()
+    return {'min': timings[0], 'median': statistics.median(timings), 'mean': statistics.fmean(timings),
+            'max': timings[-1], 'repeat': repeat, 'number': number}
+
+
+# Local stand-in for the CurrencyLayer live endpoint, answering every currency with a fixed rate
+class StubQuoteServer:
+    def __init__(self, latency=0.0):
+        latency_seconds = latency
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency_seconds)
+                query = parse_qs(urlparse(self.path).query)
+                source = query['source'][0]
+                quotes = {source + code: 1.0 + i / 10 for i, code in enumerate(query['currencies'][0].split(','))}
+                body = json.dumps({'success': True, 'quotes': quotes}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/api/live'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(currencies=51, years=11, frequency='B', repeat=5, seed=0, stub_latency=0.0, progress=sys.stderr):
+    import ratecache
+    from aggregates import AggregateIndex
+    from basket import build_amounts, value_baskets
+    from dateindex import DateIndex, PREVIOUS
+    from fxrate import FXRateService
+    from lrucache import LRUCache
+    from quotes import QuoteProvider
+    from ratestore import RateStore
+    from volatility import DEFAULT_WINDOW, VolatilityEngine
+
+    def step(name, function, **kwargs):
+        print(f"{name} ...", end=' ', file=progress, flush=True)
+        results[name] = measure(function, repeat=kwargs.get('repeat', repeat), number=kwargs.get('number', 1))
+        print(f"{results[name]['median'] * 1000:.3f} ms", file=progress)
+
+    results = {}
+    dates, values, headers = synthetic_rates(currencies, years, frequency, seed)
+    workdir = tempfile.mkdtemp(prefix='fx-benchmark-')
+    stem = f'synthetic-{currencies}x{years}y{frequency}-{os.getpid()}'
+    sources = {'xlsx': os.path.join(workdir, f'{stem}.xlsx')}
+    # The CSV layout only carries calendar dates
+    if (pd.DatetimeIndex(dates).normalize() == pd.DatetimeIndex(dates)).all():
+        sources['csv'] = os.path.join(workdir, f'{stem}-csv.csv')
+
+    try:
+        for path in sources.values():
+            write_source(path, dates, values, headers)
+
+        # Cold load parses the source and writes the binary cache; warm load maps the cache
+        for kind, path in sources.items():
+            def cold_load(path=path):
+                shutil.rmtree(ratecache._cache_dir_for(path), ignore_errors=True)
+                ratecache.load_rates(path)
+            step(f'cold_load_{kind}', cold_load, repeat=max(1, min(repeat, 3)))
+            step(f'warm_load_{kind}', lambda path=path: ratecache.load_rates(path))
+
+        store = RateStore.load(sources['xlsx'])
+        date_index = DateIndex(store.dates)
+        lookups = pd.DatetimeIndex(dates[np.random.default_rng(seed).integers(0, len(dates), 200)])
+
+        # FXRateService.get_fx_rates: uncached (every lookup computes) and cached (repeat dates)
+        uncached = FXRateService(store, cache=LRUCache(0), date_index=date_index)
+        cached = FXRateService(store, cache=LRUCache(), date_index=date_index)
+        cycle = itertools.cycle(lookups)
+        step('get_fx_rates_uncached', lambda: uncached.get_fx_rates('USD', next(cycle), PREVIOUS), number=len(lookups))
+        step('get_fx_rates_cached', lambda: cached.get_fx_rates('USD', next(cycle), PREVIOUS), number=len(lookups))
+
+        # update_output: date range, resample to buckets and min/max, on a cold and a warm pair index
+        span = (pd.Timestamp(dates[len(dates) // 4]), pd.Timestamp(dates[3 * len(dates) // 4]))
+        pair = (store.registry.codes[1], store.registry.codes[2])
+        for granularity in ('W', 'M', 'Q', 'Y'):
+            step(f'update_output_cold_{granularity}',
+                 lambda g=granularity: AggregateIndex(store, date_index).query(*pair, *span, g))
+            warm = AggregateIndex(store, date_index)
+            warm.query(*pair, *span, granularity)
+            step(f'update_output_warm_{granularity}', lambda g=granularity, warm=warm: warm.query(*pair, *span, g))
+
+        # update_volatility_graph: rolling volatility and risk classification
+        step('volatility_cold', lambda: VolatilityEngine(store, date_index).query(*pair, *span, DEFAULT_WINDOW))
+        engine = VolatilityEngine(store, date_index)
+        step('volatility_warm', lambda: engine.query(*pair, *span, DEFAULT_WINDOW))
+
+        # Basket valuation against the stub quote server, quoting every synthetic currency as the
+        # basket page does: every call fetching, and served from cache. Legs are spread over the codes.
+        codes = store.registry.codes
+        legs = codes[::max(1, len(codes) // 4)][:4]
+        baskets = [dict(zip(legs, (100, 50, 1000, 2000)))] * 10
+
+        def basket_values(provider):
+            table = provider.get_table(codes)
+            amounts, _ = build_amounts(baskets, table.codes)
+            return value_baskets(amounts, table.rates_in(codes[-1]), table.codes)
+
+        with StubQuoteServer(stub_latency) as stub:
+            fetching = QuoteProvider('benchmark', base_url=stub.url, ttl=0, stale_ttl=0)
+            step('basket_value_fetch', lambda: basket_values(fetching))
+            caching = QuoteProvider('benchmark', base_url=stub.url, ttl=3600)
+            step('basket_value_cached', lambda: basket_values(caching), number=100)
+    finally:
+        for path in sources.values():
+            shutil.rmtree(ratecache._cache_dir_for(path), ignore_errors=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': pd.Timestamp.now(tz='UTC').isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'dataset': {'currencies': currencies, 'years': years, 'frequency': frequency, 'rows': int(len(dates)), 'seed': seed},
+        },
+        'results': results,
+    }
+
+
+# Median ratio new/old per benchmark (below 1 is faster)
+def compare(old, new):
+    return {name: new['results'][name]['median'] / old['results'][name]['median']
+            for name in new['results'] if name in old['results'] and old['results'][name]['median'] > 0}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark loading, lookups, aggregation, volatility and basket valuation.')
+    parser.add_argument('--currencies', type=int, default=51, help='currency columns (default: 51, as the report)')
+    parser.add_argument('--years', type=int, default=11, help='years of history (default: 11)')
+    parser.add_argument('--frequency', default='B', help="pandas sampling frequency, e.g. B (business days) or h (hourly)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stub-latency', type=float, default=0.0, help='seconds the stub quote server waits per request')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    report = run(args.currencies, args.years, args.frequency, args.repeat, args.seed, args.stub_latency)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            ratios = compare(json.load(f), report)
+        for name, ratio in ratios.items():
+            print(f"{name:32s} {ratio:6.2f}x", file=sys.stderr)
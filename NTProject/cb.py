@@ -1,115 +1,74 @@
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output, State
-import requests
-
-# List of available currencies for selection
-available_currencies = {
-    "DZD": "Algerian dinar",
-    "AUD": "Australian dollar",
-    "BWP": "Botswana pula",
-    "BRL": "Brazilian real",
-    "BND": "Brunei dollar",
-    "CAD": "Canadian dollar",
-    "CLP": "Chilean peso",
-    "CNY": "Chinese yuan",
-    "CZK": "Czech koruna",
-    "DKK": "Danish krone",
-    "EUR": "Euro",
-    "INR": "Indian rupee",
-    "ILS": "Israeli New Shekel",
-    "JPY": "Japanese yen",
-    "KRW": "Korean won",
-    "KWD": "Kuwaiti dinar",
-    "MYR": "Malaysian ringgit",
-    "MUR": "Mauritian rupee",
-    "MXN": "Mexican peso",
-    "NZD": "New Zealand dollar",
-    "NOK": "Norwegian krone",
-    "OMR": "Omani rial",
-    "PEN": "Peruvian sol",
-    "PHP": "Philippine peso",
-    "PLN": "Polish zloty",
-    "QAR": "Qatari riyal",
-    "RUB": "Russian ruble",
-    "SAR": "Saudi Arabian riyal",
-    "SGD": "Singapore dollar",
-    "ZAR": "South African rand",
-    "SEK": "Swedish krona",
-    "CHF": "Swiss franc",
-    "THB": "Thai baht",
-    "TTD": "Trinidadian dollar",
-    "AED": "U.A.E. dirham",
-    "GBP": "U.K. pound",
-    "USD": "U.S. dollar",
-    "UYU": "Uruguayan peso"
-}
-
-# Fetch exchange rates using CurrencyLayer API
-def get_exchange_rates(api_key, base_currency):
-    currencies_string = ','.join(available_currencies.keys())
-    url = f"http://apilayer.net/api/live?access_key={api_key}&currencies={currencies_string}&source={base_currency}&format=1"
-    response = requests.get(url)
-    
-    if response.status_code == 200:
-        data = response.json()
-        if data["success"]:
-            quotes = data["quotes"]
-            rates = {k.replace(base_currency, ""): v for k, v in quotes.items()}
-            return rates
-        else:
-            raise ValueError(f"API Error: {data['error']['info']}")
-    else:
-        raise ConnectionError(f"Failed to connect to the API, Status code: {response.status_code}")
+from dash import callback, dcc, html
+from dash.dependencies import ALL, Input, Output, State
+import os
+
+import plotly.graph_objs as go
+
+from basket import build_amounts, value_baskets, value_baskets_history
+from dataset import date_index, load, on_load, registry, store
+from metrics import instrumented, register_cache
+from quotes import DEFAULT_URL, QuoteProvider
+
+# List of available currencies for selection, from the shared currency registry (ISO code -> name)
+# Filled in place once the dataset loads; the dropdowns below hold on to this same list
+currency_options = []
+on_load(lambda: currency_options.extend({'label': f"{code} - {name}", 'value': code}
+                                        for code, name in zip(registry.codes, registry.names)))
+
+# CurrencyLayer API key and endpoint (override CURRENCYLAYER_URL to use a local stand-in server)
+API_KEY = os.environ.get('CURRENCYLAYER_API_KEY', '413d262be359642528c82c4e3af35708')
+
+# Shared by every callback: pooled connections, cached snapshots, one upstream call per refresh.
+# Snapshots are quoted against USD; every base currency is triangulated from the same snapshot.
+quote_provider = QuoteProvider(API_KEY,
+                               base_url=os.environ.get('CURRENCYLAYER_URL', DEFAULT_URL),
+                               ttl=float(os.environ.get('QUOTE_TTL', 60)),
+                               stale_ttl=float(os.environ.get('QUOTE_STALE_TTL', 600)))
+register_cache('quotes', quote_provider)
+
+# Value several baskets at once against the live snapshot.
+# Returns one value per basket plus, per basket, the legs that had no rate.
+def calculate_basket_values(baskets, base_currency, provider=quote_provider):
+    table = provider.get_table(registry.codes)
+    amounts, unknown = build_amounts(baskets, table.codes)
+    values, missing = value_baskets(amounts, table.rates_in(base_currency), table.codes)
+    return values, [u + m for u, m in zip(unknown, missing)]
 
 # Function to calculate basket value
-def calculate_basket_value(basket, base_currency, api_key):
-    rates = get_exchange_rates(api_key, base_currency)
-
-    basket_value_in_base = 0
-    for currency, amount in basket.items():
-        if currency in rates:
-            rate_to_base = rates[currency]
-            basket_value_in_base += amount * rate_to_base
-        else:
-            print(f"Exchange rate for {currency} not found.")
-    
-    return basket_value_in_base
+def calculate_basket_value(basket, base_currency, provider=quote_provider):
+    values, missing = calculate_basket_values([basket], base_currency, provider)
+    return float(values[0]), missing[0]
+
+# Value of each basket on every date of the 2012-2022 history (units per USD), as a (dates x baskets) matrix
+def calculate_basket_history(baskets, base_currency):
+    if base_currency not in registry:
+        raise ValueError(f"No history available for base currency {base_currency}.")
+    amounts, unknown = build_amounts(baskets, registry.codes)
+    # Sorted unique dates, as the other views read them (no NaT, repeats or out-of-order appends)
+    index = date_index.snapshot()
+    return index.dates, value_baskets_history(amounts, store.matrix(index.rows), registry.id(base_currency)), unknown
 
-# Initialize the app
-app = dash.Dash(__name__)
+# One currency/amount row of the basket; rows are matched by index in the callbacks
+def leg_row(index, currency):
+    return html.Div(style={'margin-bottom': '20px'}, children=[
+        html.Label(f"Currency {index + 1}", style={'fontWeight': 'bold'}),
+        dcc.Dropdown(id={'type': 'leg-currency', 'index': index}, options=currency_options, value=currency),
+        html.Label(f"Amount for Currency {index + 1}", style={'fontWeight': 'bold'}),
+        dcc.Input(id={'type': 'leg-amount', 'index': index}, type='number', value=0, step=0.01, style={'width': '100%', 'padding': '10px', 'border': '1px solid #ccc', 'borderRadius': '4px'}),
+    ])
 
-app.layout = html.Div(style={'fontFamily': 'Arial, sans-serif', 'padding': '20px', 'backgroundColor': '#f4f4f4'}, children=[
+layout = html.Div(style={'fontFamily': 'Arial, sans-serif', 'padding': '20px', 'backgroundColor': '#f4f4f4'}, children=[
     html.H1("Custom Currency Basket", style={'textAlign': 'center', 'color': '#2c3e50'}),
     
-    # Currency 1 input
-    html.Div(style={'margin-bottom': '20px'}, children=[
-        html.Label("Currency 1", style={'fontWeight': 'bold'}),
-        dcc.Dropdown(id='currency1', options=[{'label': f"{code} - {name}", 'value': code} for code, name in available_currencies.items()], value='USD'),
-        html.Label("Amount for Currency 1", style={'fontWeight': 'bold'}),
-        dcc.Input(id='amount1', type='number', value=0, step=0.01, style={'width': '100%', 'padding': '10px', 'border': '1px solid #ccc', 'borderRadius': '4px'}),
-    ]),
-    
-    # Currency 2 input
-    html.Div(style={'margin-bottom': '20px'}, children=[
-        html.Label("Currency 2", style={'fontWeight': 'bold'}),
-        dcc.Dropdown(id='currency2', options=[{'label': f"{code} - {name}", 'value': code} for code, name in available_currencies.items()], value='EUR'),
-        html.Label("Amount for Currency 2", style={'fontWeight': 'bold'}),
-        dcc.Input(id='amount2', type='number', value=0, step=0.01, style={'width': '100%', 'padding': '10px', 'border': '1px solid #ccc', 'borderRadius': '4px'}),
-    ]),
-    
-    # Currency 3 input
-    html.Div(style={'margin-bottom': '20px'}, children=[
-        html.Label("Currency 3", style={'fontWeight': 'bold'}),
-        dcc.Dropdown(id='currency3', options=[{'label': f"{code} - {name}", 'value': code} for code, name in available_currencies.items()], value='JPY'),
-        html.Label("Amount for Currency 3", style={'fontWeight': 'bold'}),
-        dcc.Input(id='amount3', type='number', value=0, step=0.01, style={'width': '100%', 'padding': '10px', 'border': '1px solid #ccc', 'borderRadius': '4px'}),
-    ]),
+    # Basket legs (start with three, more can be added)
+    html.Div(id='basket-legs', children=[leg_row(0, 'USD'), leg_row(1, 'EUR'), leg_row(2, 'JPY')]),
+    html.Button('Add Currency', id='add-leg-btn', style={'backgroundColor': '#95a5a6', 'color': 'white', 'border': 'none', 'padding': '10px 20px', 'borderRadius': '5px', 'cursor': 'pointer', 'margin-bottom': '20px'}),
     
     # Base currency selection
     html.Div(style={'margin-bottom': '20px'}, children=[
         html.Label("Base Currency", style={'fontWeight': 'bold'}),
-        dcc.Dropdown(id='base_currency', options=[{'label': f"{code} - {name}", 'value': code} for code, name in available_currencies.items()], value='INR'),
+        dcc.Dropdown(id='base_currency', options=currency_options, value='INR'),
     ]),
     
     # Button to calculate the basket value
@@ -119,40 +78,60 @@ app.layout = html.Div(style={'fontFamily': 'Arial, sans-serif', 'padding': '20px
     # Display result
     html.Hr(),
     html.H3("Basket Value", style={'textAlign': 'center', 'color': '#2980b9'}),
-    html.Div(id='basket_value', style={'margin-top': '20px', 'textAlign': 'center', 'fontSize': '24px', 'color': '#2c3e50'})
+    html.Div(id='basket_value', style={'margin-top': '20px', 'textAlign': 'center', 'fontSize': '24px', 'color': '#2c3e50'}),
+    dcc.Graph(id='basket-history-graph')
 ])
 
-@app.callback(
+@callback(
+    Output('basket-legs', 'children'),
+    Input('add-leg-btn', 'n_clicks'),
+    State('basket-legs', 'children'),
+    prevent_initial_call=True
+)
+@instrumented('add_leg')
+def add_leg(n_clicks, legs):
+    return legs + [leg_row(len(legs), 'GBP')]
+
+@callback(
     Output('basket_value', 'children'),
+    Output('basket-history-graph', 'figure'),
     Input('calculate-btn', 'n_clicks'),
-    State('currency1', 'value'),
-    State('currency2', 'value'),
-    State('currency3', 'value'),
-    State('amount1', 'value'),
-    State('amount2', 'value'),
-    State('amount3', 'value'),
+    State({'type': 'leg-currency', 'index': ALL}, 'value'),
+    State({'type': 'leg-amount', 'index': ALL}, 'value'),
     State('base_currency', 'value'),
 )
-def calculate_basket_value_callback(n_clicks, cur1, cur2, cur3, amt1, amt2, amt3, base):
+@instrumented('calculate_basket_value_callback')
+def calculate_basket_value_callback(n_clicks, currencies, amounts, base):
     if n_clicks is None:
-        return "Basket value will be shown here"
-
-    # Prepare basket
-    basket = {
-        cur1: amt1,
-        cur2: amt2,
-        cur3: amt3
-    }
-    
-    # Replace with your CurrencyLayer API key
-    api_key = '413d262be359642528c82c4e3af35708'  # Replace with your actual API key
-    
+        return "Basket value will be shown here", go.Figure()
+
+    # Prepare basket (legs with the same currency add up)
+    basket = {}
+    for currency, amount in zip(currencies, amounts):
+        if currency:
+            basket[currency] = basket.get(currency, 0) + (amount or 0)
+
+    # Value of the same basket over the whole history
+    try:
+        dates, values, _ = calculate_basket_history([basket], base)
+        figure = go.Figure(data=[go.Scatter(x=dates, y=values[:, 0], mode='lines', name=f'Basket in {base}')])
+        figure.update_layout(title=f'Basket Value in {base} Over Time', xaxis_title='Date', yaxis_title=f'Value in {base}', template='plotly')
+    except ValueError:
+        figure = go.Figure()
+
     # Calculate the basket's value in the base currency
     try:
-        basket_value = calculate_basket_value(basket, base, api_key)
-        return f"The value of the basket in {base} is: {basket_value:.2f}"
+        basket_value, missing = calculate_basket_value(basket, base)
+        message = f"The value of the basket in {base} is: {basket_value:.2f}"
+        if missing:
+            message += f" (no exchange rate for {', '.join(missing)})"
+        return message, figure
     except Exception as e:
-        return str(e)
+        return str(e), figure
 
+# Run this page on its own; app.py serves all pages together
 if __name__ == '__main__':
+        app = dash.Dash(__name__)
+        load()
+        app.layout = layout
         app.run_server(debug=True)
\ No newline at end of file
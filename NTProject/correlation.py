@@ -0,0 +1,96 @@
+from collections import namedtuple
+
+import numpy as np
+
+from lrucache import LRUCache
+from volatility import TRADING_DAYS
+
+# Pairs with fewer overlapping returns than this get NaN instead of a noisy estimate
+MIN_OBSERVATIONS = 20
+
+# All-pairs statistics for one date range. Covariance and correlation are N x N over the
+# registry's currencies; volatility is annualized per currency.
+CorrelationResult = namedtuple('CorrelationResult', ['covariance', 'correlation', 'volatility', 'observations'])
+
+
+# Daily log returns of every column, aligned with the input rows (NaN where either day is missing)
+def log_return_matrix(values):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        logs = np.log(values)
+    returns = np.full(values.shape, np.nan)
+    returns[1:] = np.diff(logs, axis=0)
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+# Pairwise-complete covariance and correlation of a (dates x currencies) return block.
+# Missing values are handled with a validity mask in a handful of matrix products,
+# so no row-by-row filling or dropping is needed.
+def pairwise_statistics(returns, min_observations=MIN_OBSERVATIONS):
+    valid = ~np.isnan(returns)
+    mask = valid.astype(np.float64)
+    x = np.where(valid, returns, 0.0)
+
+    n = mask.T @ mask                 # overlapping observations per pair
+    sum_x = x.T @ mask                # [i, j]: sum of i over days where j is present too
+    sum_xx = (x * x).T @ mask
+    sum_xy = x.T @ x
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = (sum_xy - sum_x * sum_x.T / n) / (n - 1)
+        var_x = (sum_xx - sum_x ** 2 / n) / (n - 1)
+        correlation = covariance / np.sqrt(var_x * var_x.T)
+
+    too_few = n < min_observations
+    covariance[too_few] = np.nan
+    correlation[too_few] = np.nan
+    correlation[~np.isfinite(correlation)] = np.nan
+    return covariance, np.clip(correlation, -1.0, 1.0), n.astype(np.int64)
+
+
+# All-pairs correlation/covariance and per-currency volatility for any date range,
+# cached by the range's position in the date index
+class CorrelationEngine:
+    def __init__(self, rate_store, date_index, cache_size=32):
+        self.store = rate_store
+        self.date_index = date_index
+        self._returns = None
+        self.cache = LRUCache(cache_size)
+
+    @property
+    def currencies(self):
+        return self.store.registry.codes
+
+    # Daily log returns over the sorted dates, computed on first use
+    @property
+    def returns(self):
+        if self._returns is None:
+            self._returns = log_return_matrix(self.store.matrix(self.date_index.rows))
+        return self._returns
+
+    # dataset.on_append listener. New dates only add return rows (cached ranges keep their
+    # positions); if the index was rebuilt the returns are recomputed and the cache dropped.
+    def extend(self, first_position, in_order):
+        if self._returns is None:
+            return
+        if not in_order or first_position == 0 or len(self._returns) != first_position:
+            self._returns = log_return_matrix(self.store.matrix(self.date_index.rows))
+            self.cache.clear()
+            return
+        new = log_return_matrix(self.store.matrix(self.date_index.rows[first_position - 1:]))[1:]
+        self._returns = np.concatenate((self._returns, new))
+
+    def query(self, start, end):
+        i, j = self.date_index.range_positions(start, end)
+        return self.cache.get_or_compute((i, j), lambda: self._compute(i, j))
+
+    def _compute(self, i, j):
+        covariance, correlation, observations = pairwise_statistics(self.returns[i:j])
+        volatility = np.sqrt(np.diag(covariance) * TRADING_DAYS)
+        return CorrelationResult(covariance, correlation, volatility, observations)
+
+    # (currency, annualized volatility) from most to least volatile; currencies without data are left out
+    def volatility_ranking(self, start, end):
+        volatility = self.query(start, end).volatility
+        order = [i for i in np.argsort(-volatility) if np.isfinite(volatility[i])]
+        return [(self.currencies[i], float(volatility[i])) for i in order]
@@ -0,0 +1,34 @@
+import numpy as np
+
+# All rates in the dataset are quoted as units of each currency per one unit of a common
+# pivot (U.S. dollar). Any cross rate is therefore a ratio of two entries of the same row,
+# so whole vectors and matrices of cross rates come out of a single broadcast division.
+
+
+# Units of the base currency per one unit of every currency.
+# Works on a single row (n,) or a block of rows (t, n); invalid rates come back as NaN.
+def cross_rate_vector(rates, base_index):
+    rates = np.asarray(rates, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cross = rates[..., base_index:base_index + 1] / rates
+    cross[~np.isfinite(cross)] = np.nan
+    return cross
+
+
+# Same for a block of rows (t, n) with its own base per row: units of base_indices[k] per one
+# unit of every currency on row k
+def cross_rate_rows(rates, base_indices):
+    rates = np.asarray(rates, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cross = rates[np.arange(len(rates)), base_indices][:, None] / rates
+    cross[~np.isfinite(cross)] = np.nan
+    return cross
+
+
+# N x N matrix where entry [i, j] is units of currency i per one unit of currency j
+def cross_rate_matrix(rates):
+    rates = np.asarray(rates, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cross = rates[:, None] / rates[None, :]
+    cross[~np.isfinite(cross)] = np.nan
+    return cross
@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import namedtuple
+
+from dateindex import DateIndex
+from ingest import APPEND_LOG, AppendLog
+from partitions import PARTITION_DIR, PartitionedStore
+from ratecache import XLSX_PATH, fingerprint
+from ratestore import RateStore
+
+# The one rate store every page reads from. Nothing is read until the data is first used (or
+# load() is called, e.g. by the warm-up in warmup.py), so the server can bind its port at once.
+#
+# The arrays are memory-mapped read-only from the binary cache, so their pages live in the
+# OS page cache and are shared by every process that maps them, including each gunicorn
+# worker loading its own copy. Nothing below may write into these arrays.
+# FX_RATE_DTYPE=float64 keeps full precision.
+Dataset = namedtuple('Dataset', ['store', 'registry', 'date_index', 'append_log'])
+
+_data = None
+_load_lock = threading.Lock()
+_load_listeners = []
+
+_listeners = []
+_refresh_lock = threading.Lock()
+_poll_seconds = float(os.environ.get('FX_INGEST_POLL_SECONDS', 30))
+_last_poll = 0.0
+
+# Identifies the data being served: the workbook contents plus the number of rows ingested
+# since, and when either last changed. Set by load().
+_source_version = None
+_last_modified = None
+
+
+# Load the dataset on first call (other threads wait for it) and return it
+def load():
+    global _data, _source_version, _last_modified
+    if _data is not None:
+        return _data
+    with _load_lock:
+        if _data is None:
+            store = RateStore.load(XLSX_PATH, dtype=os.environ.get('FX_RATE_DTYPE', 'float32'))
+            _source_version = fingerprint(XLSX_PATH)[:16]
+            _last_modified = os.path.getmtime(XLSX_PATH)
+            data = Dataset(store, store.registry, DateIndex(store.dates), AppendLog(APPEND_LOG, store.registry.codes))
+            _refresh(data, notify=False)
+            _data = data
+            for listener in _load_listeners:
+                listener()
+    return _data
+
+
+def is_loaded():
+    return _data is not None
+
+
+# Register listener(), called once the dataset has been loaded (right away if it already is)
+def on_load(listener):
+    with _load_lock:
+        if _data is None:
+            _load_listeners.append(listener)
+            return listener
+    listener()
+    return listener
+
+
+# Stands in for one part of the dataset and loads it on first use, so modules can hold on to
+# `store`, `registry` and `date_index` from import time without reading anything
+class _Lazy:
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(getattr(load(), self._name), attribute)
+
+    def __len__(self):
+        return len(getattr(load(), self._name))
+
+    def __contains__(self, item):
+        return item in getattr(load(), self._name)
+
+    def __repr__(self):
+        return f'<lazy dataset.{self._name}>'
+
+
+store = _Lazy('store')
+
+# Currency registry (ISO codes <-> column ids) shared by every module
+registry = _Lazy('registry')
+
+# Sorted date index shared by every date lookup
+date_index = _Lazy('date_index')
+
+# Rows appended after the workbook was exported (see ingest.py)
+append_log = _Lazy('append_log')
+
+# Optional date-partitioned copy of the rates (see partitions.py). When FX_PARTITION_DIR is set,
+# the converter and volatility views read just the partitions their date range overlaps.
+partitioned = PartitionedStore(PARTITION_DIR) if PARTITION_DIR else None
+
+
+# (version tag, last modified as a POSIX timestamp) of the dataset, for HTTP caching
+def version():
+    data = load()
+    return f'{_source_version}-{len(data.store)}', _last_modified
+
+
+# Register listener(first_position, in_order), called after new rows have been added to the
+# store and the date index. first_position is the index length before the new rows; in_order
+# is False when the index had to be rebuilt, so positions cached before may have shifted.
+def on_append(listener):
+    _listeners.append(listener)
+    return listener
+
+
+# Pick up rows appended to the log since the last refresh. Returns the number of new rows.
+def refresh():
+    return _refresh(load())
+
+
+def _refresh(data, notify=True):
+    global _last_poll, _last_modified
+    with _refresh_lock:
+        _last_poll = time.monotonic()
+        new = data.append_log.read_new()
+        if new is None:
+            return 0
+        dates, values = new
+        first_row, first_position = len(data.store), len(data.date_index)
+        data.store.append(dates, values)
+        in_order = data.date_index.extend(dates, first_row)
+        _last_modified = max(_last_modified, os.path.getmtime(data.append_log.path))
+        for listener in _listeners if notify else ():
+            listener(first_position, in_order)
+        return len(dates)
+
+
+# refresh(), at most once every FX_INGEST_POLL_SECONDS; cheap enough to call on every request.
+# Does nothing until the dataset has been loaded, since loading reads the log anyway.
+def refresh_if_due():
+    if _data is not None and time.monotonic() - _last_poll >= _poll_seconds:
+        refresh()
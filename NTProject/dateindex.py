@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+# As-of lookup modes
+PREVIOUS = 'previous'  # last available date on or before the requested one
+NEXT = 'next'          # first available date on or after the requested one
+NEAREST = 'nearest'    # closest available date, ties go to the previous one
+EXACT = 'exact'        # only the requested date itself
+LOOKUP_MODES = (PREVIOUS, NEXT, NEAREST, EXACT)
+
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+def _to_datetime64(dates):
+    return pd.DatetimeIndex(dates).to_numpy(dtype='datetime64[ns]')
+
+
+# One immutable state of a DateIndex: sorted unique dates, the table row of each, and whether
+# those rows are consecutive. The index swaps whole snapshots, so a reader holding one never
+# mixes dates and rows from before and after a refresh.
+class IndexSnapshot:
+    __slots__ = ('dates', 'rows', 'contiguous')
+
+    def __init__(self, dates, rows, contiguous):
+        object.__setattr__(self, 'dates', dates)
+        object.__setattr__(self, 'rows', rows)
+        object.__setattr__(self, 'contiguous', contiguous)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("IndexSnapshot is immutable")
+
+    def __len__(self):
+        return len(self.dates)
+
+    # Positions in the sorted index for many dates; -1 where nothing matches under the given mode
+    def _positions(self, dates, mode):
+        if mode not in LOOKUP_MODES:
+            raise ValueError(f"Unknown lookup mode '{mode}', expected one of {', '.join(LOOKUP_MODES)}.")
+
+        targets = _to_datetime64(dates)
+        n = len(self.dates)
+        if n == 0:
+            return np.full(len(targets), -1)
+
+        left = np.searchsorted(self.dates, targets, side='left')
+        right = np.searchsorted(self.dates, targets, side='right')
+
+        if mode == EXACT:
+            positions = np.where(right > left, left, -1)
+        elif mode == PREVIOUS:
+            positions = right - 1
+        elif mode == NEXT:
+            positions = np.where(left < n, left, -1)
+        else:
+            previous = right - 1
+            following = np.minimum(left, n - 1)
+            has_previous = previous >= 0
+            gap_before = targets - self.dates[np.maximum(previous, 0)]
+            gap_after = self.dates[following] - targets
+            use_following = (left < n) & (~has_previous | (gap_after < gap_before))
+            positions = np.where(use_following, following, np.where(has_previous, previous, -1))
+
+        positions[np.isnat(targets)] = -1
+        return positions
+
+    # Row positions for many dates at once; -1 where nothing matches under the given mode
+    def lookup_many(self, dates, mode=EXACT):
+        positions = self._positions(dates, mode)
+        return np.where(positions >= 0, self.rows[np.maximum(positions, 0)] if len(self.rows) else -1, -1)
+
+    # Row position and matched date for a single date, or (-1, None) when nothing matches
+    def lookup(self, date, mode=EXACT):
+        position = int(self._positions([date], mode)[0])
+        if position < 0:
+            return -1, None
+        return int(self.rows[position]), pd.Timestamp(self.dates[position])
+
+    # Positions [i, j) in the sorted index of the dates between start and end, both inclusive by
+    # calendar day. Either bound may be None for an open range.
+    def range_positions(self, start=None, end=None):
+        i = 0 if start is None else int(np.searchsorted(self.dates, _to_datetime64([start])[0].astype('datetime64[D]'), side='left'))
+        j = len(self.dates) if end is None else int(np.searchsorted(self.dates, _to_datetime64([end])[0].astype('datetime64[D]') + ONE_DAY, side='left'))
+        return i, max(i, j)
+
+    # Table rows for the same range. Returns a slice when the table allows it.
+    def range_rows(self, start=None, end=None):
+        i, j = self.range_positions(start, end)
+        if self.contiguous:
+            first = int(self.rows[0]) if len(self.rows) else 0
+            return slice(first + i, first + j)
+        return self.rows[i:j]
+
+
+def _is_contiguous(rows):
+    return bool(len(rows) == 0 or np.array_equal(rows, np.arange(rows[0], rows[0] + len(rows))))
+
+
+# Sorted, de-duplicated index over the dates of a rate table.
+# Lookups are binary searches and return row positions in the original (unsorted) table.
+# NaT dates are left out; for repeated dates the last row wins.
+# Each call reads the current snapshot once; callers combining several lookups (e.g. positions
+# and then the dates at them) take snapshot() once and query that.
+class DateIndex:
+    def __init__(self, dates):
+        dates = _to_datetime64(dates)
+        self._build(dates, np.arange(len(dates)))
+
+    def _build(self, dates, rows):
+        valid = ~np.isnat(dates)
+        dates, rows = dates[valid], rows[valid]
+        order = np.lexsort((rows, dates))
+        sorted_dates, sorted_rows = dates[order], rows[order]
+
+        last_of_run = np.ones(len(order), dtype=bool)
+        last_of_run[:-1] = sorted_dates[1:] != sorted_dates[:-1]
+
+        rows = sorted_rows[last_of_run]
+        # When the table is already sorted and unique, ranges map to plain slices (views, no copy)
+        self._snapshot = IndexSnapshot(sorted_dates[last_of_run], rows, _is_contiguous(rows))
+
+    # The current dates, rows and contiguity, consistent with each other
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def dates(self):
+        return self._snapshot.dates
+
+    @property
+    def rows(self):
+        return self._snapshot.rows
+
+    @property
+    def contiguous(self):
+        return self._snapshot.contiguous
+
+    # Add rows appended to the table (their dates, starting at table row first_row).
+    # Returns True when they all come after the current last date, in which case they are
+    # simply appended and every existing position stays valid; otherwise the index is
+    # rebuilt and positions may shift.
+    def extend(self, dates, first_row):
+        current = self._snapshot
+        dates = _to_datetime64(dates)
+        rows = np.arange(first_row, first_row + len(dates))
+        in_order = (len(dates) > 0 and not np.isnat(dates).any() and bool(np.all(dates[1:] > dates[:-1]))
+                    and (len(current.dates) == 0 or dates[0] > current.dates[-1]))
+        if in_order:
+            contiguous = current.contiguous and (len(current.rows) == 0 or first_row == current.rows[-1] + 1)
+            self._snapshot = IndexSnapshot(np.concatenate([current.dates, dates]),
+                                           np.concatenate([current.rows, rows]), contiguous)
+        else:
+            self._build(np.concatenate([current.dates, dates]), np.concatenate([current.rows, rows]))
+        return in_order
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def lookup_many(self, dates, mode=EXACT):
+        return self._snapshot.lookup_many(dates, mode)
+
+    def lookup(self, date, mode=EXACT):
+        return self._snapshot.lookup(date, mode)
+
+    def range_positions(self, start=None, end=None):
+        return self._snapshot.range_positions(start, end)
+
+    def range_rows(self, start=None, end=None):
+        return self._snapshot.range_rows(start, end)
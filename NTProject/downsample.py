@@ -0,0 +1,60 @@
+import numpy as np
+
+# Default number of points a chart trace is reduced to before it is sent to the browser
+DEFAULT_POINT_BUDGET = 1000
+
+
+# Largest-Triangle-Three-Buckets: pick `budget` indices that preserve the visual shape of (x, y).
+# First and last points are always kept; x must be increasing.
+def lttb(x, y, budget):
+    n = len(x)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.intp)
+
+    selected = np.empty(budget, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for b in range(budget - 2):
+        start, stop = edges[b], edges[b + 1]
+        # Average of the next bucket is the third corner of the triangle
+        next_stop = edges[b + 2] if b + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[b + 1] = previous
+    return selected
+
+
+# Indices to plot for a trace under a point budget, plus how many points were dropped.
+# Traces within budget are returned whole. Otherwise missing y values are left out and the
+# global min/max and any `keep` indices always survive.
+def decimate(x, y, budget=DEFAULT_POINT_BUDGET, keep=()):
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) <= budget:
+        return np.arange(len(y)), 0
+    present = np.flatnonzero(~np.isnan(y))
+
+    if np.issubdtype(np.asarray(x).dtype, np.datetime64):
+        x = np.asarray(x).astype('datetime64[ns]').astype(np.int64)
+    x = np.asarray(x, dtype=np.float64)
+
+    keep = np.intersect1d(np.asarray(keep, dtype=np.intp), present)
+    keep = np.union1d(keep, [present[np.argmin(y[present])], present[np.argmax(y[present])]])
+    chosen = present[lttb(x[present], y[present], max(budget - len(keep), 3))]
+    indices = np.union1d(chosen, keep)
+    return indices, len(y) - len(indices)
+
+
+# Positions where a categorical series changes value, together with the point just before each
+def transitions(codes):
+    codes = np.asarray(codes)
+    change = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    return np.union1d(change, change - 1)
@@ -1,55 +1,117 @@
+import logging
+import os
+
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from dash import Dash, html, dcc, Input, Output
+from dash import Dash, callback, html, dcc, Input, Output
 from dash.dash_table import DataTable
 
-# Load the dataset
-df = pd.read_csv(r'C:\Users\lenovo\Desktop\NTProject\Combine_Exchange_Rate_Report_2012-2022 - Exchange_Rate_Report_2012.csv.csv')
-
-# Ensure the 'Date' column is in datetime format and set it as the index
-df['Date'] = pd.to_datetime(df['Date'], format='%d-%b-%y', errors='coerce')
-df.set_index('Date', inplace=True)
+from crossrates import cross_rate_matrix, cross_rate_vector
+from dataset import date_index, load, on_append, on_load, store
+from dateindex import EXACT, NEAREST, NEXT, PREVIOUS, DateIndex
+from lrucache import LRUCache
+from metrics import instrumented, register_cache
 
-# Normalize the column names
-df.columns = [col.strip().replace(' ', '_').replace('(', '').replace(')', '') for col in df.columns]
+log = logging.getLogger(__name__)
 
-# Get unique currencies for dropdown
-currencies = df.columns.tolist()
+# Get unique currencies for dropdown (labelled by full name, valued by ISO code).
+# Filled in place once the dataset loads; the layout below holds on to this same list.
+currency_options = []
+on_load(lambda: currency_options.extend(store.registry.options()))
 
 class FXRateService:
-    def __init__(self, data_frame):
-        self.data_frame = data_frame
-
-    def get_fx_rates(self, base_currency, date):
+    def __init__(self, rate_store, cache=None, date_index=None):
+        self.store = rate_store
+        # Results keyed on (base currency, date); pass LRUCache(0) to disable
+        self.cache = cache if cache is not None else LRUCache()
+        self.date_index = date_index if date_index is not None else DateIndex(rate_store.dates)
+
+    @property
+    def registry(self):
+        return self.store.registry
+
+    # Row position and actual date used for a requested date under the given as-of mode
+    def resolve_date(self, date, mode=EXACT):
+        return self.date_index.lookup(date, mode)
+
+    # Rates are keyed by ISO code; base_currency may be an ISO code or a full column header.
+    # mode picks the fallback when the date itself has no row: previous, next, nearest or exact
+    def get_fx_rates(self, base_currency, date, mode=EXACT):
         if not isinstance(date, datetime):
             raise ValueError("Date must be a datetime object.")
-        
-        date_str = date.strftime('%Y-%m-%d')
-        print(f"Selected Date: {date_str}, Base Currency: {base_currency}")  # Debug statement
 
-        try:
-            rates_on_date = self.data_frame.loc[date]
-        except KeyError:
+        if base_currency not in self.registry:
+            return None, f"{base_currency} is not available in the dataset."
+        base_currency = self.registry.code(base_currency)
+
+        position, rate_date = self.resolve_date(date, mode)
+        log.debug("FX rates for %s on %s (%s) resolved to row %d", base_currency, date, mode, position)
+        if position < 0:
+            return None, f"No exchange rates found for {base_currency} on {date.strftime('%Y-%m-%d')}"
+
+        # Keyed on the resolved date so every request falling back to the same day shares one entry
+        return self.cache.get_or_compute((base_currency, rate_date),
+                                         lambda: self._compute_fx_rates(base_currency, position, rate_date))
+
+    def _compute_fx_rates(self, base_currency, position, rate_date):
+        date_str = rate_date.strftime('%Y-%m-%d')
+        base_id = self.registry.id(base_currency)
+
+        rates_on_date = self.store.row(position)
+        if np.isnan(rates_on_date[base_id]):
             return None, f"No exchange rates found for {base_currency} on {date_str}"
 
-        if base_currency not in rates_on_date.keys():
+        # Rate from every target to the base in one broadcast; skip targets with no rate that day
+        cross = cross_rate_vector(rates_on_date, base_id)
+        valid = np.flatnonzero(~np.isnan(cross))
+        all_rates = {self.registry.codes[i]: float(cross[i]) for i in valid}
+
+        return all_rates, None  # Return None for error message if no issues
+
+    # Rates from every currency to the base for many dates at once (one row per requested date)
+    def get_fx_rates_bulk(self, base_currency, dates, mode=EXACT):
+        if base_currency not in self.registry:
             return None, f"{base_currency} is not available in the dataset."
 
-        base_rate = rates_on_date[base_currency]
-        all_rates = {}
+        dates = pd.DatetimeIndex(dates)
+        positions = self.date_index.lookup_many(dates, mode)
 
-        for currency in rates_on_date.index:
-            target_rate = rates_on_date[currency]
-            if pd.notnull(target_rate):  # Ensure the rate is not NaN
-                all_rates[currency] = base_rate / target_rate  # Calculate rate from target to base
+        # Dates with no match under the mode come back as all-NaN rows
+        block = np.full((len(dates), len(self.registry)), np.nan)
+        found = positions >= 0
+        block[found] = cross_rate_vector(self.store.matrix(positions[found]), self.registry.id(base_currency))
 
-        print("Fetched Rates:", all_rates)  # Debug statement
-        return all_rates, None  # Return None for error message if no issues
+        return pd.DataFrame(block, index=dates, columns=self.registry.codes), None
+
+    # Full cross-rate matrix for one date: entry [row, column] is units of row per one column
+    def get_cross_rate_matrix(self, date, mode=EXACT):
+        position, _ = self.resolve_date(date, mode)
+        if position < 0:
+            return None, f"No exchange rates found on {pd.Timestamp(date).strftime('%Y-%m-%d')}"
+
+        matrix = cross_rate_matrix(self.store.row(position))
+        return pd.DataFrame(matrix, index=self.registry.codes, columns=self.registry.codes), None
+
+    # dataset.on_append listener. Cached rates are keyed by date, so new dates leave them valid;
+    # a rebuilt index may have replaced rows for existing dates, so the cache is dropped then.
+    def extend(self, first_position, in_order):
+        if not in_order:
+            self.cache.clear()
 
-# Initialize the Dash app
-app = Dash(__name__)
+    def cache_stats(self):
+        return self.cache.stats()
 
-app.layout = html.Div([
+# One service per process shared by every callback, so repeat (base, date) requests hit the cache.
+# FX_RATE_CACHE_SIZE bounds the number of entries, FX_RATE_CACHE_TTL optionally expires them (seconds).
+_cache_ttl = os.environ.get('FX_RATE_CACHE_TTL')
+fx_service = FXRateService(store, cache=LRUCache(maxsize=int(os.environ.get('FX_RATE_CACHE_SIZE', 256)),
+                                              ttl=float(_cache_ttl) if _cache_ttl else None),
+                           date_index=date_index)
+on_append(fx_service.extend)
+register_cache('fx_rates', fx_service.cache)
+
+layout = html.Div([
     html.H1("Foreign Exchange Rate Converter", style={'textAlign': 'center', 'color': '#87CEEB', 'padding': '20px 0'}),  # Sky blue title
 
     # Center the dropdown and make it sky blue
@@ -57,7 +119,7 @@ app.layout = html.Div([
         html.Label("Select Base Currency:", style={'fontSize': '16px', 'marginBottom': '10px'}),
         dcc.Dropdown(
             id='base-currency-dropdown',
-            options=[{'label': currency.replace('_', ' '), 'value': currency} for currency in currencies],
+            options=currency_options,
             value='USD',  # Default value set to USD
             clearable=False,
             style={'width': '50%', 'margin': '0 auto', 'backgroundColor': 'skyblue'}  # Center and set sky blue background
@@ -72,6 +134,20 @@ app.layout = html.Div([
             display_format='YYYY-MM-DD',
             style={'marginBottom': '20px'}
         ),
+
+        # What to do when the picked date has no rates (weekends, holidays)
+        dcc.RadioItems(
+            id='lookup-mode',
+            options=[
+                {'label': 'Previous business day', 'value': PREVIOUS},
+                {'label': 'Next business day', 'value': NEXT},
+                {'label': 'Nearest business day', 'value': NEAREST},
+                {'label': 'Exact date only', 'value': EXACT}
+            ],
+            value=PREVIOUS,
+            inline=True,
+            style={'marginBottom': '20px'}
+        ),
         
         html.Button('Get FX Rates', id='get-rates-button', n_clicks=0, 
                     style={'backgroundColor': '#87CEEB', 'color': 'white', 'padding': '10px 20px', 'border': 'none', 
@@ -84,35 +160,46 @@ app.layout = html.Div([
                   style_cell={'textAlign': 'center', 'padding': '10px', 'backgroundColor': '#f9f9f9', 
                               'border': '1px solid #ddd'}),
         
+        html.Div(id='rate-date-note', style={'textAlign': 'center', 'fontSize': '14px'}),
         html.Div(id='error-message', style={'color': 'red', 'textAlign': 'center', 'fontSize': '16px'})
     ], style={'padding': '10px 0'})
 ], style={'maxWidth': '1000px', 'margin': 'auto', 'backgroundColor': '#f4f4f4', 'borderRadius': '8px', 
           'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)', 'padding': '20px'})  # Removed the extra closing parenthesis here
 
-@app.callback(
+@callback(
     Output('fx-rates-table', 'columns'),
     Output('fx-rates-table', 'data'),
     Output('error-message', 'children'),  # Output for error messages
+    Output('rate-date-note', 'children'),
     Input('get-rates-button', 'n_clicks'),
     Input('base-currency-dropdown', 'value'),
-    Input('date-picker', 'date')
+    Input('date-picker', 'date'),
+    Input('lookup-mode', 'value')
 )
-def update_fx_rates(n_clicks, base_currency, selected_date):
+@instrumented('update_fx_rates')
+def update_fx_rates(n_clicks, base_currency, selected_date, lookup_mode):
     if n_clicks > 0:
         date = pd.to_datetime(selected_date)
-        fx_service = FXRateService(df)
-        all_rates, error_message = fx_service.get_fx_rates(base_currency, date)
+        all_rates, error_message = fx_service.get_fx_rates(base_currency, date, lookup_mode)
 
         if error_message:
-            return [], [], error_message  # Return empty if there was an error
+            return [], [], error_message, ""  # Return empty if there was an error
+
+        # Tell the user when the rates come from a different day than the one picked
+        _, rate_date = fx_service.resolve_date(date, lookup_mode)
+        note = f"Showing rates for {rate_date:%Y-%m-%d}" if rate_date != date.normalize() else ""
         
         # Prepare data for the DataTable
         if isinstance(all_rates, dict):
-            rates_data = [{'Currency': currency.replace('_', ' '), 'Rate': round(rate, 6)} for currency, rate in all_rates.items()]
+            rates_data = [{'Currency': store.registry.label(currency), 'Rate': round(rate, 6)} for currency, rate in all_rates.items()]
             columns = [{'name': 'Currency', 'id': 'Currency'}, {'name': 'Rate', 'id': 'Rate'}]
-            return columns, rates_data, ""  # Clear error message if successful
+            return columns, rates_data, "", note  # Clear error message if successful
         
-    return [], [], ""  # Return empty if button not clicked
+    return [], [], "", ""  # Return empty if button not clicked
 
+# Run this page on its own; app.py serves all pages together
 if __name__ == "__main__":
+    app = Dash(__name__)
+    load()
+    app.layout = layout
     app.run_server(debug=False)
\ No newline at end of file
@@ -0,0 +1,16 @@
+import os
+
+# Import app.py in the master process before forking, so workers share the imported code. The
+# rate data itself is loaded lazily in each worker; the memory-mapped cache it reads is shared
+# between them through the page cache.
+preload_app = True
+
+bind = os.environ.get('BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('THREADS', 4))
+
+
+# Threads do not survive fork, so each worker starts its own background warm-up (see warmup.py)
+def post_fork(server, worker):
+    import warmup
+    warmup.start()
@@ -1,31 +1,63 @@
-from dash import Dash, dcc, html, Input, Output, State
+from dash import Dash, callback, dcc, html, Input, Output, State
+import os
+
+import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
 
-app = Dash(__name__)
-
-# Load the dataset
-file_path = 'C:\\Users\\lenovo\\Desktop\\NTProject\\Combine_Exchange_Rate_Report_2012-2022.xlsx'
-df = pd.read_excel(file_path)
-
-# Convert 'Date' column to datetime format
-df['Date'] = pd.to_datetime(df['Date'])
-
-# Set 'Date' as the index
-df.set_index('Date', inplace=True)
+from aggregates import AggregateIndex, WindowedAggregates
+from correlation import CorrelationEngine
+from dataset import date_index, load, on_append, on_load, partitioned, registry, store
+from downsample import DEFAULT_POINT_BUDGET, decimate, transitions
+from metrics import instrumented, register_cache
+from volatility import DEFAULT_THRESHOLDS, DEFAULT_WINDOW, RISK_COLORS, RISK_LEVELS, WINDOWS, VolatilityEngine, WindowedVolatility
+
+# FX_RISK_THRESHOLDS="low,high" (annualized volatility) sets the risk bands
+_risk_thresholds = os.environ.get('FX_RISK_THRESHOLDS')
+_thresholds = [float(t) for t in _risk_thresholds.split(',')] if _risk_thresholds else DEFAULT_THRESHOLDS
+
+if partitioned is not None:
+    # Histories too long to index whole: each query reads only the partitions it overlaps
+    aggregate_index = WindowedAggregates(partitioned)
+    volatility_engine = WindowedVolatility(partitioned, thresholds=_thresholds)
+else:
+    # Per-pair prefix sums and min/max tables for the converter chart, built on first use
+    aggregate_index = AggregateIndex(store, date_index)
+    # Rolling volatility per pair and window
+    volatility_engine = VolatilityEngine(store, date_index, thresholds=_thresholds)
+    # Rows ingested while running extend the cached aggregates instead of invalidating them
+    on_append(aggregate_index.extend)
+    on_append(volatility_engine.extend)
+    register_cache('aggregates', aggregate_index.cache)
+    register_cache('volatility', volatility_engine.cache)
+
+# Currencies the converter and volatility charts can read: the partitioned store's own set when
+# partitions are configured (it is re-read when an import changes it), the dataset's otherwise
+def chart_registry():
+    return partitioned.registry if partitioned is not None else registry
+
+# All-pairs correlation/covariance over the daily return matrix, cached per date range
+correlation_engine = CorrelationEngine(store, date_index)
+on_append(correlation_engine.extend)
+register_cache('correlation', correlation_engine.cache)
+
+# Maximum points per chart trace sent to the browser (Largest-Triangle-Three-Buckets thinning)
+point_budget = int(os.environ.get('FX_CHART_POINT_BUDGET', DEFAULT_POINT_BUDGET))
 
 # Sample currency list for the dropdown (using only relevant currencies)
-currency_list = df.columns.tolist()  # Get column names from the dataset
+# Full names as labels, ISO codes as values; filled in place once the dataset loads
+currency_options = []
+on_load(lambda: currency_options.extend(chart_registry().options()))
 
-app.layout = html.Div([
+layout = html.Div([
     html.H1("Currency Converter"),
     
     html.Div([
         html.Label("Select Currency to Convert From:"),
-        dcc.Dropdown(id='currency-from-dropdown', options=[{'label': currency, 'value': currency} for currency in currency_list], value='U.S. dollar (USD)'),
+        dcc.Dropdown(id='currency-from-dropdown', options=currency_options, value='USD'),
         
         html.Label("Select Currency to Convert To:"),
-        dcc.Dropdown(id='currency-to-dropdown', options=[{'label': currency, 'value': currency} for currency in currency_list], value='Australian dollar (AUD)'),
+        dcc.Dropdown(id='currency-to-dropdown', options=currency_options, value='AUD'),
         
         html.Label("Enter Amount:"),
         dcc.Input(id='amount-input', type='number', placeholder='Enter amount', min=0),
@@ -61,15 +93,15 @@ app.layout = html.Div([
         html.Label("Select Currency 1:"),
         dcc.Dropdown(
             id='currency1-dropdown',
-            options=[{'label': col, 'value': col} for col in currency_list],
-            value='U.S. dollar (USD)'  # Default value
+            options=currency_options,
+            value='USD'  # Default value
         ),
         
         html.Label("Select Currency 2:"),
         dcc.Dropdown(
             id='currency2-dropdown',
-            options=[{'label': col, 'value': col} for col in currency_list],
-            value='Australian dollar (AUD)'  # Default value
+            options=currency_options,
+            value='AUD'  # Default value
         ),
         
         html.Label("Select Volatility Date Range:"),
@@ -82,12 +114,45 @@ app.layout = html.Div([
             max_date_allowed=pd.to_datetime('2022-12-31')
         ),
         
+        html.Label("Select Volatility Window:"),
+        dcc.Dropdown(
+            id='volatility-window-dropdown',
+            options=[{'label': label, 'value': window} for window, label in WINDOWS.items()],
+            value=DEFAULT_WINDOW,
+            clearable=False
+        ),
+        
         dcc.Graph(id='volatility-graph'),
         html.Div(id='risk-output', style={'margin-top': '20px'})
+    ]),
+    
+    html.Div([
+        html.H2("Currency Correlation and Volatility Ranking"),
+        
+        html.Label("Select Date Range:"),
+        dcc.DatePickerRange(
+            id='correlation-date-picker-range',
+            start_date=pd.to_datetime('2012-01-01'),
+            end_date=pd.to_datetime('2022-12-31'),
+            display_format='YYYY-MM-DD',
+            min_date_allowed=pd.to_datetime('2012-01-01'),
+            max_date_allowed=pd.to_datetime('2022-12-31')
+        ),
+        
+        html.Label("Select Measure:"),
+        dcc.RadioItems(
+            id='correlation-measure',
+            options=[{'label': 'Correlation', 'value': 'correlation'}, {'label': 'Covariance', 'value': 'covariance'}],
+            value='correlation',
+            inline=True
+        ),
+        
+        dcc.Graph(id='correlation-heatmap'),
+        dcc.Graph(id='volatility-ranking-graph')
     ])
 ])
 
-@app.callback(
+@callback(
     Output('conversion-graph', 'figure'),
     Output('result-output', 'children'),
     Input('convert-button', 'n_clicks'),
@@ -98,36 +163,37 @@ app.layout = html.Div([
     State('date-picker-range', 'end_date'),
     State('granularity-dropdown', 'value')
 )
+@instrumented('update_output')
 def update_output(n_clicks, currency_from, currency_to, amount, start_date, end_date, granularity):
     if n_clicks is None or amount is None or amount <= 0:
         return go.Figure(), 'Please fill in all fields and press Convert.'
 
-    # Filter the dataframe for the selected date range
-    filtered_data = df.loc[start_date:end_date]
-
     # Check if the currencies are in the dataframe
-    if currency_from not in filtered_data.columns or currency_to not in filtered_data.columns:
+    if currency_from not in chart_registry() or currency_to not in chart_registry():
         return go.Figure(), f"Currency '{currency_from}' or '{currency_to}' not found in the dataset."
 
+    # Per-bucket averages for the selected range and granularity, from the pair's precomputed aggregates
+    aggregate = aggregate_index.query(currency_from, currency_to, start_date, end_date, granularity)
+
     # Ensure there is data in the filtered range
-    if filtered_data.empty:
+    if aggregate is None:
         return go.Figure(), f"No data available for the selected date range."
 
-    # Calculate conversion based on actual rates
-    filtered_data['Converted'] = filtered_data[currency_to] / filtered_data[currency_from] * amount
-
-    # Resample the data based on the user-selected granularity
-    resampled_data = filtered_data['Converted'].resample(granularity).mean()
-
     # Check if resampled data is empty
-    if resampled_data.empty:
+    if aggregate.min_date is None:
         return go.Figure(), f"No data available for the selected granularity in the date range."
 
-    # Calculate min and max values
-    min_value = resampled_data.min()
-    max_value = resampled_data.max()
-    min_date = resampled_data.idxmin()
-    max_date = resampled_data.idxmax()
+    # Scale the unit conversion by the amount (amount > 0, so min/max stay in place)
+    resampled_data = pd.Series(aggregate.means * amount, index=aggregate.labels)
+
+    # Thin long series (e.g. weekly over ten years) to the point budget, keeping the min/max buckets
+    extrema = aggregate.labels.get_indexer([aggregate.min_date, aggregate.max_date])
+    kept, dropped = decimate(resampled_data.index, resampled_data.to_numpy(), point_budget, keep=extrema)
+    resampled_data = resampled_data.iloc[kept]
+    min_value = aggregate.min_value * amount
+    max_value = aggregate.max_value * amount
+    min_date = aggregate.min_date
+    max_date = aggregate.max_date
 
     # Create the graph
     figure = go.Figure(data=[
@@ -184,64 +250,106 @@ def update_output(n_clicks, currency_from, currency_to, amount, start_date, end_
                          template='plotly')
 
     return figure, f'Converted {amount} {currency_from} to {currency_to} over the date range from {start_date} to {end_date}.<br>' + \
-                   f'Min Value: {min_value:.2f}<br>Max Value: {max_value:.2f}'
+                   f'Min Value: {min_value:.2f}<br>Max Value: {max_value:.2f}' + \
+                   (f'<br>Showing {len(kept)} of {len(kept) + dropped} points ({dropped} dropped).' if dropped else '')
 
-@app.callback(
+@callback(
     Output('volatility-graph', 'figure'),
     Output('risk-output', 'children'),
     Input('currency1-dropdown', 'value'),
     Input('currency2-dropdown', 'value'),
     Input('volatility-date-picker-range', 'start_date'),
-    Input('volatility-date-picker-range', 'end_date')
+    Input('volatility-date-picker-range', 'end_date'),
+    Input('volatility-window-dropdown', 'value')
 )
-def update_volatility_graph(currency1, currency2, start_date, end_date):
-    # Filter data for selected currencies and date range
-    filtered_df = df.loc[start_date:end_date]
-
-    # Calculate fluctuations
-    filtered_df['Fluctuation'] = abs(filtered_df[currency1] - filtered_df[currency2])
+@instrumented('update_volatility_graph')
+def update_volatility_graph(currency1, currency2, start_date, end_date, window):
+    # Check if the currencies are in the dataframe
+    if currency1 not in chart_registry() or currency2 not in chart_registry():
+        return go.Figure(), f"Currency '{currency1}' or '{currency2}' not found in the dataset."
+    if window not in WINDOWS:
+        window = DEFAULT_WINDOW
 
-    # Define risk thresholds
-    low_threshold = 0.5  # Adjust these values based on your dataset
-    high_threshold = 2.0
+    # Rolling volatility of the pair's log returns (cached per pair and window), sliced to the range
+    dates, volatility, risk = volatility_engine.query(currency1, currency2, start_date, end_date, window)
 
-    # Determine risk level and assign color
-    filtered_df['Risk'] = filtered_df['Fluctuation'].apply(
-        lambda x: 'Low Risk' if x <= low_threshold else ('Medium Risk' if x <= high_threshold else 'High Risk')
-    )
+    # Risk counts cover every point, even the ones thinned out of the chart below
+    risk_count = np.bincount(risk, minlength=len(RISK_LEVELS))
 
-    filtered_df['Color'] = filtered_df['Risk'].map({
-        'Low Risk': 'green',
-        'Medium Risk': 'orange',
-        'High Risk': 'red'
-    })
+    # Thin the trace to the point budget, keeping every change of risk band
+    kept, dropped = decimate(dates, volatility, point_budget, keep=transitions(risk))
+    dates, volatility, risk = dates[kept], volatility[kept], risk[kept]
 
     # Create the volatility graph with colored points based on risk
     figure = go.Figure()
 
     figure.add_trace(go.Scatter(
-        x=filtered_df.index,
-        y=filtered_df['Fluctuation'],
+        x=dates,
+        y=volatility * 100,
         mode='lines+markers',
-        name='Fluctuation',
-        marker=dict(color=filtered_df['Color'], size=8),
+        name='Volatility',
+        marker=dict(color=RISK_COLORS[risk], size=8),
         line=dict(color='blue'),  # Line stays blue
-        hovertemplate='Date: %{x}<br>Fluctuation: %{y:.2f}<extra></extra>'
+        hovertemplate='Date: %{x}<br>Volatility: %{y:.2f}%<extra></extra>'
     ))
 
-    # Calculate and show risk count
-    risk_count = filtered_df['Risk'].value_counts()
-    risk_text = f"Risk Levels: Low Risk: {risk_count.get('Low Risk', 0)}, Medium Risk: {risk_count.get('Medium Risk', 0)}, High Risk: {risk_count.get('High Risk', 0)}"
+    # Show risk count
+    risk_text = f"Risk Levels: Low Risk: {risk_count[0]}, Medium Risk: {risk_count[1]}, High Risk: {risk_count[2]}"
+    if dropped:
+        risk_text += f" (showing {len(kept)} of {len(kept) + dropped} points, {dropped} dropped)"
 
-    figure.update_layout(title=f'Volatility Between {currency1} and {currency2}',
+    figure.update_layout(title=f'Volatility Between {currency1} and {currency2} ({WINDOWS[window]} Window)',
                          xaxis_title='Date',
-                         yaxis_title='Fluctuation',
+                         yaxis_title='Annualized Volatility (%)',
                          template='plotly')
 
     return figure, risk_text
 
+@callback(
+    Output('correlation-heatmap', 'figure'),
+    Output('volatility-ranking-graph', 'figure'),
+    Input('correlation-date-picker-range', 'start_date'),
+    Input('correlation-date-picker-range', 'end_date'),
+    Input('correlation-measure', 'value')
+)
+@instrumented('update_correlation_view')
+def update_correlation_view(start_date, end_date, measure):
+    # All-pairs statistics from one pass over the return matrix (cached per date range)
+    result = correlation_engine.query(start_date, end_date)
+    matrix = result.correlation if measure == 'correlation' else result.covariance
+
+    heatmap = go.Figure(go.Heatmap(
+        z=matrix,
+        x=registry.codes,
+        y=registry.codes,
+        colorscale='RdBu',
+        zmid=0,
+        hovertemplate='%{y} / %{x}: %{z:.4f}<extra></extra>'
+    ))
+    heatmap.update_layout(title=f'Daily Return {measure.title()} Between All Currencies',
+                          height=800,
+                          template='plotly')
+
+    # Per-currency annualized volatility, most volatile first
+    ranking = correlation_engine.volatility_ranking(start_date, end_date)
+    ranking_figure = go.Figure(go.Bar(
+        x=[currency for currency, _ in ranking],
+        y=[volatility * 100 for _, volatility in ranking],
+        hovertext=[registry.label(currency) for currency, _ in ranking],
+        hovertemplate='%{hovertext}<br>Volatility: %{y:.2f}%<extra></extra>'
+    ))
+    ranking_figure.update_layout(title='Currency Volatility Ranking',
+                                 xaxis_title='Currency',
+                                 yaxis_title='Annualized Volatility (%)',
+                                 template='plotly')
+
+    return heatmap, ranking_figure
 
+# Run this page on its own; app.py serves all pages together
 if __name__ == '__main__':
+    app = Dash(__name__)
+    load()
+    app.layout = layout
     app.run_server(debug=True)
 
 
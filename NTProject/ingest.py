@@ -0,0 +1,103 @@
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+from ratecache import DATA_DIR, XLSX_PATH, load_rates, parse_source
+from ratestore import CurrencyRegistry
+
+# Daily rates published after the workbook was exported. Rows are only ever appended here;
+# running processes poll the file and pick up new rows without reloading the dataset.
+# Once the workbook has been regenerated with these rows, delete both files.
+APPEND_LOG = os.environ.get('FX_APPEND_LOG', os.path.join(DATA_DIR, 'appended_rates.bin'))
+
+
+def _layout_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+# Append-only log of fixed-size binary records: the date (ns since epoch) followed by one
+# float64 rate per currency in registry order, NaN where missing. The currency layout is kept
+# next to the log so a reader can check it matches the dataset it is extending.
+class AppendLog:
+    def __init__(self, path, currencies):
+        self.path = path
+        self.currencies = list(currencies)
+        self.record = np.dtype([('date', '<i8'), ('rates', '<f8', (len(self.currencies),))])
+        self.offset = 0
+        self._lock = threading.Lock()
+
+    def _check_layout(self, create=False):
+        layout = _layout_path(self.path)
+        if not os.path.exists(layout):
+            if not create:
+                return
+            with open(layout, 'w') as f:
+                json.dump({'currencies': self.currencies}, f)
+        with open(layout) as f:
+            currencies = json.load(f)['currencies']
+        if currencies != self.currencies:
+            raise ValueError(f"{self.path} was written for a different set of currencies.")
+
+    # Write rows (dates plus a matrix in registry order) as one block at the end of the log
+    def append(self, dates, values):
+        records = np.empty(len(dates), dtype=self.record)
+        records['date'] = np.asarray(dates, dtype='datetime64[ns]').astype(np.int64)
+        records['rates'] = values
+        self._check_layout(create=True)
+        with open(self.path, 'ab') as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        return len(records)
+
+    # (dates, values) for the complete records written since the last call. A record still
+    # being written is left for the next call.
+    def read_new(self):
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = 0
+            count = (size - self.offset) // self.record.itemsize
+            if count <= 0:
+                return None
+
+            self._check_layout()
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                records = np.frombuffer(f.read(count * self.record.itemsize), dtype=self.record)
+            self.offset += count * self.record.itemsize
+        return records['date'].astype('datetime64[ns]'), records['rates']
+
+
+# Re-order parsed columns (full headers or ISO codes) into the registry's column order
+def align_columns(registry, currencies, values):
+    unknown = [currency for currency in currencies if currency not in registry]
+    if unknown:
+        raise ValueError(f"Unknown currencies: {', '.join(unknown)}")
+
+    aligned = np.full((len(values), len(registry)), np.nan)
+    aligned[:, [registry.id(currency) for currency in currencies]] = values
+    return aligned
+
+
+# Append the rows of CSV/XLSX exports (same layout as the bundled report) to the log:
+#   python ingest.py new_rates.csv [more.xlsx ...]
+if __name__ == '__main__':
+    registry = CurrencyRegistry(load_rates(XLSX_PATH).currencies)
+    log = AppendLog(APPEND_LOG, registry.codes)
+    for path in sys.argv[1:]:
+        dates, values, currencies = parse_source(path)
+        keep = ~np.isnat(dates)
+        count = log.append(dates[keep], align_columns(registry, currencies, values[keep]))
+        print(f"{path}: appended {count} rows to {APPEND_LOG}")
+
+    # With FX_PARTITION_DIR the converter and volatility charts read only the partitioned copy,
+    # so the same rows are merged into it; running servers see the new partitions on their next read
+    from partitions import PARTITION_DIR, PartitionedStore, import_sources
+    if PARTITION_DIR:
+        partitioned = import_sources(sys.argv[1:], PARTITION_DIR, PartitionedStore(PARTITION_DIR).unit)
+        print(f"{PARTITION_DIR}: {len(partitioned)} rows in {len(partitioned.keys)} partitions")
@@ -0,0 +1,149 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+
+from flask import Response, g, has_request_context
+
+# Minimal in-process metrics in the Prometheus text format, without extra dependencies.
+# Every process keeps its own numbers, so under gunicorn each worker reports its own share.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+
+log = logging.getLogger(__name__)
+
+_metrics = []
+_caches = {}
+_lock = threading.Lock()
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                yield f'{self.name}{_labels(self.labelnames, labels)} {value}'
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._series[labels] = (counts, total + value)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        names = self.labelnames + ('le',)
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    yield f'{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}'
+                yield f'{self.name}_sum{_labels(self.labelnames, labels)} {total}'
+                yield f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}'
+
+
+callback_seconds = Histogram('fx_callback_duration_seconds', 'Time spent in Dash callbacks.', ['callback'])
+callback_errors = Counter('fx_callback_errors_total', 'Dash callbacks that raised.', ['callback'])
+callback_payload = Histogram('fx_callback_payload_bytes', 'Size of Dash callback responses.', ['callback'], SIZE_BUCKETS)
+load_seconds = Histogram('fx_data_load_seconds', 'Time to load a rate table.', ['source', 'cache'])
+upstream_seconds = Histogram('fx_upstream_request_seconds', 'Time spent on upstream quote requests.', ['outcome'])
+
+
+# Time a Dash callback and attribute its response size to it. Goes under @callback:
+#   @callback(...)
+#   @instrumented('update_output')
+#   def update_output(...):
+def instrumented(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if has_request_context():
+                g.fx_callback = name
+            began = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                callback_errors.inc(name)
+                raise
+            finally:
+                elapsed = time.perf_counter() - began
+                callback_seconds.observe(elapsed, name)
+                log.debug("%s took %.1f ms", name, elapsed * 1000)
+        return wrapper
+    return decorate
+
+
+# Report an LRUCache (or anything with a compatible stats()) under the given name
+def register_cache(name, cache):
+    with _lock:
+        _caches[name] = cache
+
+
+def _cache_lines():
+    with _lock:
+        caches = sorted(_caches.items())
+    stats = [(name, cache.stats()) for name, cache in caches]
+    for metric, key, kind, documentation in (
+            ('fx_cache_hits_total', 'hits', 'counter', 'Cache lookups answered from the cache.'),
+            ('fx_cache_misses_total', 'misses', 'counter', 'Cache lookups that had to compute.'),
+            ('fx_cache_entries', 'size', 'gauge', 'Entries currently cached.')):
+        yield f'# HELP {metric} {documentation}'
+        yield f'# TYPE {metric} {kind}'
+        for name, values in stats:
+            if key in values:
+                yield f'{metric}{_labels(("cache",), (name,))} {values[key]}'
+
+
+def render():
+    lines = [line for metric in _metrics for line in metric.render()]
+    lines.extend(_cache_lines())
+    return '\n'.join(lines) + '\n'
+
+
+# Flask view for /metrics
+def metrics_view():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+# Hook into a Flask server: /metrics, and response sizes of the callbacks it dispatched
+def install(server):
+    server.add_url_rule('/metrics', 'metrics', metrics_view)
+
+    @server.after_request
+    def record_payload(response):
+        name = g.pop('fx_callback', None)
+        if name is not None and response.content_length is not None:
+            callback_payload.observe(response.content_length, name)
+        return response
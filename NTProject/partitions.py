@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from dateindex import ONE_DAY
+from ingest import AppendLog, align_columns
+from lrucache import LRUCache
+from ratecache import XLSX_PATH, iter_source_chunks
+from ratestore import CurrencyRegistry
+
+# Partition sizes: one partition per year, month or day (for intraday histories)
+PARTITION_UNITS = {'Y': 'datetime64[Y]', 'M': 'datetime64[M]', 'D': 'datetime64[D]'}
+
+# Default location of the partitioned copy of the rates
+PARTITION_DIR = os.environ.get('FX_PARTITION_DIR')
+
+
+# Partition key ('2012', '2012-03' or '2012-03-05') for each date
+def partition_keys(dates, unit):
+    return np.datetime_as_string(np.asarray(dates, dtype='datetime64[ns]').astype(PARTITION_UNITS[unit]))
+
+
+# Midnight of a date's calendar day as datetime64[ns]
+def _day(date):
+    return pd.Timestamp(date).normalize().to_datetime64()
+
+
+def _read_meta(root):
+    with open(os.path.join(root, 'meta.json')) as f:
+        return json.load(f)
+
+
+def _write_meta(root, meta):
+    tmp = os.path.join(root, 'meta.tmp.json')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(root, 'meta.json'))
+
+
+# Rates stored as one directory per date partition, each holding sorted unique dates and a
+# float32 rate matrix with NaN gaps. Range reads memory-map only the partitions that overlap
+# the range, so memory is bounded by the query window rather than the whole history.
+class PartitionedStore:
+    def __init__(self, root, cache_size=16):
+        self.root = root
+        self.cache = LRUCache(cache_size)
+        self._meta_mtime = None
+        self._load_meta()
+
+    def _load_meta(self):
+        mtime = os.stat(os.path.join(self.root, 'meta.json')).st_mtime_ns
+        if mtime != self._meta_mtime:
+            meta = _read_meta(self.root)
+            self.unit = meta['unit']
+            self.registry = CurrencyRegistry(meta['currencies'])
+            self.partitions = meta['partitions']
+            self.keys = sorted(self.partitions)
+            self.first = np.array([self.partitions[k]['first'] for k in self.keys], dtype='datetime64[ns]')
+            self.last = np.array([self.partitions[k]['last'] for k in self.keys], dtype='datetime64[ns]')
+            self._meta_mtime = mtime
+
+    def __len__(self):
+        return sum(partition['rows'] for partition in self.partitions.values())
+
+    # Keys of the partitions holding dates between start and end (inclusive by calendar day)
+    def partitions_for(self, start=None, end=None):
+        self._load_meta()
+        overlap = np.ones(len(self.keys), dtype=bool)
+        if start is not None:
+            overlap &= self.last >= _day(start)
+        if end is not None:
+            overlap &= self.first < _day(end) + ONE_DAY
+        return [key for key, hit in zip(self.keys, overlap) if hit]
+
+    def _partition(self, key):
+        # A re-import rewrites the partition under a new version, so stale maps are never reused
+        version = self.partitions[key]['version']
+
+        def load():
+            directory = os.path.join(self.root, key)
+            return (np.load(os.path.join(directory, f'dates-{version}.npy'), mmap_mode='r'),
+                    np.load(os.path.join(directory, f'values-{version}.npy'), mmap_mode='r'))
+        return self.cache.get_or_compute((key, version), load)
+
+    # (dates, float64 matrix with NaN gaps) for the dates between start and end, both inclusive
+    # by calendar day; columns optionally restricts the currencies (ISO codes or headers)
+    def read(self, start=None, end=None, columns=None):
+        ids = slice(None) if columns is None else [self.registry.id(currency) for currency in columns]
+        lo = None if start is None else _day(start)
+        hi = None if end is None else _day(end) + ONE_DAY
+
+        dates, values = [], []
+        for key in self.partitions_for(start, end):
+            partition_dates, partition_values = self._partition(key)
+            i = 0 if lo is None else int(np.searchsorted(partition_dates, lo, side='left'))
+            j = len(partition_dates) if hi is None else int(np.searchsorted(partition_dates, hi, side='left'))
+            dates.append(partition_dates[i:j])
+            values.append(np.asarray(partition_values[i:j][:, ids], dtype=np.float64))
+
+        width = len(self.registry) if columns is None else len(ids)
+        if not dates:
+            return np.empty(0, dtype='datetime64[ns]'), np.empty((0, width))
+        return np.concatenate(dates), np.concatenate(values)
+
+    # One currency's rates between start and end
+    def column(self, currency, start=None, end=None):
+        dates, values = self.read(start, end, [currency])
+        return dates, values[:, 0]
+
+
+# Convert CSV/XLSX exports into a partitioned store at root, streaming them in chunks so
+# memory stays bounded by the chunk size and the largest partition. Importing into an existing
+# store merges the new rows into the partitions they fall in; for repeated dates the last row wins.
+def import_sources(paths, root, unit='Y', chunk_rows=50000):
+    if unit not in PARTITION_UNITS:
+        raise ValueError(f"Unknown partition unit '{unit}', expected one of {', '.join(PARTITION_UNITS)}.")
+
+    os.makedirs(root, exist_ok=True)
+    meta = _read_meta(root) if os.path.exists(os.path.join(root, 'meta.json')) else None
+    if meta is not None and meta['unit'] != unit:
+        raise ValueError(f"{root} is partitioned by '{meta['unit']}', not '{unit}'.")
+
+    registry = CurrencyRegistry(meta['currencies']) if meta else None
+    spill_dir = tempfile.mkdtemp(prefix='spill-', dir=root)
+    spills = {}
+    try:
+        # Pass 1: route each chunk's rows to a per-partition spill log on disk
+        for path in paths:
+            for dates, values, currencies in iter_source_chunks(path, chunk_rows):
+                if registry is None:
+                    registry = CurrencyRegistry(currencies)
+                values = align_columns(registry, currencies, values)
+                keep = ~np.isnat(dates)
+                dates, values = dates[keep], values[keep]
+                keys = partition_keys(dates, unit)
+                for key in np.unique(keys):
+                    if key not in spills:
+                        spills[key] = AppendLog(os.path.join(spill_dir, f'{key}.bin'), registry.codes)
+                    spills[key].append(dates[keys == key], values[keys == key])
+
+        # Pass 2: one partition at a time, merge with what is already stored, sort and de-duplicate
+        partitions = dict(meta['partitions']) if meta else {}
+        existing = PartitionedStore(root, cache_size=0) if meta else None
+        for key, spill in spills.items():
+            dates, values = spill.read_new()
+            if key in partitions:
+                stored = existing._partition(key)
+                dates = np.concatenate((stored[0], dates))
+                values = np.concatenate((np.asarray(stored[1], dtype=np.float64), values))
+            partitions[key] = _write_partition(os.path.join(root, key), dates, values,
+                                               partitions.get(key, {}).get('version', 0) + 1)
+            os.remove(spill.path)
+
+        _write_meta(root, {'unit': unit, 'currencies': registry.columns, 'partitions': partitions})
+
+        # Processes that already mapped a previous version keep their (unlinked) copy
+        for key in spills:
+            directory = os.path.join(root, key)
+            for name in os.listdir(directory):
+                if not name.endswith(f"-{partitions[key]['version']}.npy"):
+                    os.remove(os.path.join(directory, name))
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    return PartitionedStore(root)
+
+
+def _write_partition(directory, dates, values, version):
+    # Stable sort, then keep the last row of every run of equal dates
+    order = np.argsort(dates, kind='stable')
+    dates, values = dates[order], values[order]
+    last_of_run = np.ones(len(dates), dtype=bool)
+    last_of_run[:-1] = dates[1:] != dates[:-1]
+    dates, values = dates[last_of_run], values[last_of_run]
+
+    # Each version gets its own files, so readers of the previous metadata keep working
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, f'dates-{version}.npy'), dates)
+    np.save(os.path.join(directory, f'values-{version}.npy'), values.astype(np.float32))
+
+    return {'rows': int(len(dates)), 'first': str(dates[0]), 'last': str(dates[-1]), 'version': version}
+
+
+# Build or extend a partitioned store:
+#   python partitions.py ROOT [Y|M|D] [source.csv|source.xlsx ...]
+# With no sources the bundled workbook is imported.
+if __name__ == '__main__':
+    root = sys.argv[1]
+    unit = sys.argv[2] if len(sys.argv) > 2 else 'Y'
+    store = import_sources(sys.argv[3:] or [XLSX_PATH], root, unit)
+    print(f"{root}: {len(store)} rows in {len(store.keys)} partitions")
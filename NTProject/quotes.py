@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from crossrates import cross_rate_vector
+
+log = logging.getLogger(__name__)
+
+# CurrencyLayer live endpoint; point base_url at a local stand-in server for testing
+DEFAULT_URL = 'http://apilayer.net/api/live'
+
+# Every snapshot is fetched against this one currency; other bases are triangulated from it
+PIVOT_CURRENCY = 'USD'
+
+
+# Parsed quote snapshot: units of each currency per one unit of the pivot, indexed by ISO code
+class QuoteTable:
+    def __init__(self, pivot, codes, per_pivot):
+        self.pivot = pivot
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.per_pivot = np.asarray(per_pivot, dtype=np.float64)
+
+    # Build from the API's {'USDEUR': 0.92, ...} quotes
+    @classmethod
+    def from_quotes(cls, pivot, quotes):
+        rates = {pivot: 1.0}
+        for pair, rate in quotes.items():
+            if pair.startswith(pivot) and len(pair) == len(pivot) + 3:
+                rates[pair[len(pivot):]] = rate
+        return cls(pivot, rates.keys(), list(rates.values()))
+
+    # Units of the base currency per one unit of every currency in the table (cross rate via the pivot)
+    def rates_in(self, base_currency):
+        if base_currency not in self.index:
+            raise ValueError(f"Exchange rate for base currency {base_currency} not found.")
+        return cross_rate_vector(self.per_pivot, self.index[base_currency])
+
+
+# One upstream request in progress; concurrent callers for the same key wait on it
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Live quote fetcher with a pooled session, a TTL cache of snapshots, single-flight
+# de-duplication of concurrent identical requests, and stale-while-revalidate refreshes.
+#
+# Snapshots younger than ttl are served as-is. Between ttl and ttl + stale_ttl the old
+# snapshot is served immediately while one background request refreshes it. Older than
+# that (or never fetched) the caller waits for the upstream request.
+class QuoteProvider:
+    def __init__(self, api_key, base_url=DEFAULT_URL, pivot=PIVOT_CURRENCY, ttl=60, stale_ttl=600, timeout=5, pool_size=10,
+                 session=None):
+        self.api_key = api_key
+        self.pivot = pivot
+        self.base_url = base_url
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+
+        self._snapshots = {}  # key -> (QuoteTable, fetched_at)
+        self._inflight = {}   # key -> _Flight
+        self._lock = threading.Lock()
+
+    # QuoteTable for the given currencies, quoted against the pivot. One snapshot serves every base.
+    def get_table(self, currencies):
+        key = tuple(sorted(set(currencies) | {self.pivot}))
+
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            age = time.monotonic() - snapshot[1] if snapshot else None
+            if snapshot and age <= self.ttl:
+                self.hits += 1
+                return snapshot[0]
+            if snapshot and age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                # Claimed under the same lock as the staleness check, so concurrent stale readers
+                # start one refresh between them
+                refresh = None if key in self._inflight else self._inflight.setdefault(key, _Flight())
+            else:
+                self.misses += 1
+                refresh = False
+
+        if refresh is False:
+            return self._fetch_shared(key)
+        if refresh is not None:
+            threading.Thread(target=self._refresh_in_background, args=(key, refresh), daemon=True).start()
+        return snapshot[0]
+
+    def _refresh_in_background(self, key, flight):
+        try:
+            self._lead(key, flight)
+        except Exception as e:
+            # Keep serving the stale snapshot; the next request retries
+            log.warning("Background refresh of %d quotes failed: %s: %s", len(key), type(e).__name__, e)
+
+    def _fetch_shared(self, key):
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        return self._lead(key, flight)
+
+    # Fetch on behalf of everyone waiting on the flight registered for key
+    def _lead(self, key, flight):
+        try:
+            flight.result = self._fetch(key)
+            with self._lock:
+                self._snapshots[key] = (flight.result, time.monotonic())
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def _fetch(self, currencies):
+        params = {'access_key': self.api_key, 'currencies': ','.join(currencies), 'source': self.pivot, 'format': 1}
+        with self._lock:
+            self.upstream_calls += 1
+        began = time.perf_counter()
+        outcome = 'error'
+        try:
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                # The exception text holds the request URL, access_key included, so it is only logged
+                log.debug("Quote request failed: %s", e)
+                raise ConnectionError(f"Failed to connect to the API: {type(e).__name__}") from e
+
+            if response.status_code == 200:
+                data = response.json()
+                if data["success"]:
+                    outcome = 'ok'
+                    return QuoteTable.from_quotes(self.pivot, data["quotes"])
+                else:
+                    raise ValueError(f"API Error: {data['error']['info']}")
+            else:
+                raise ConnectionError(f"Failed to connect to the API, Status code: {response.status_code}")
+        finally:
+            elapsed = time.perf_counter() - began
+            metrics.upstream_seconds.observe(elapsed, outcome)
+            log.debug("Quote request for %d currencies: %s in %.1f ms", len(currencies), outcome, elapsed * 1000)
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'upstream_calls': self.upstream_calls,
+                'snapshots': len(self._snapshots),
+            }
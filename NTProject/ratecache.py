@@ -0,0 +1,207 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, the per-process temp files still apply
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Source files shipped with the project
+XLSX_PATH = os.path.join(DATA_DIR, 'Combine_Exchange_Rate_Report_2012-2022.xlsx')
+CSV_PATH = os.path.join(DATA_DIR, 'Combine_Exchange_Rate_Report_2012-2022 - Exchange_Rate_Report_2012.csv.csv')
+
+# Where the binary columnar copies live (one sub-directory per source file)
+CACHE_DIR = os.environ.get('FX_CACHE_DIR', os.path.join(DATA_DIR, '.ratecache'))
+
+# Bump whenever the on-disk layout changes so old caches are rebuilt
+CACHE_VERSION = 3
+
+# Value precisions the cache can hold; float32 is the default in memory. Each precision is
+# cached on its own, and only the one requested is written.
+DTYPES = ('float32', 'float64')
+
+# Mostly-filled columns are kept dense: `values` (dates x dense columns) holds 0 where there is no
+# rate and `valid` is the matching bitmask packed along the date axis (np.packbits(..., axis=0)),
+# so a missing day still costs a full value plus one bit. Columns with few rates are kept sparse,
+# CSR-style: for sparse column k, rows[offsets[k]:offsets[k + 1]] are the sorted rows that have a
+# rate and values[...] the rates, so a missing day costs nothing.
+RateData = namedtuple('RateData', ['dates', 'dense', 'values', 'valid', 'sparse', 'currencies'])
+SparseColumns = namedtuple('SparseColumns', ['columns', 'offsets', 'rows', 'values'])
+
+
+# Fingerprint of the source file contents plus the cache layout version
+def fingerprint(path):
+    digest = hashlib.sha1(f'v{CACHE_VERSION}:'.encode())
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# The exports end every row with a trailing comma, which shows up as an empty 'Unnamed' column
+def _currency_columns(columns):
+    return [col for col in columns if col != 'Date' and not str(col).startswith('Unnamed') and col is not None]
+
+
+def _arrays(raw, dates, currencies):
+    values = np.ascontiguousarray(raw[currencies].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64))
+    return dates.to_numpy(dtype='datetime64[ns]'), values, [str(col).strip() for col in currencies]
+
+
+# Parse the spreadsheet/CSV into (dates, float matrix with NaN gaps, currency header)
+def parse_source(path):
+    if path.lower().endswith(('.xlsx', '.xls')):
+        raw = pd.read_excel(path)
+        dates = pd.to_datetime(raw['Date'], errors='coerce')
+    else:
+        raw = pd.read_csv(path)
+        dates = pd.to_datetime(raw['Date'], format='%d-%b-%y', errors='coerce')
+    return _arrays(raw, dates, _currency_columns(raw.columns))
+
+
+# Same as parse_source, but yields the rows in chunks of at most chunk_rows so files larger
+# than memory can be converted. XLSX files are streamed row by row in read-only mode.
+def iter_source_chunks(path, chunk_rows=50000):
+    if not path.lower().endswith(('.xlsx', '.xls')):
+        for raw in pd.read_csv(path, chunksize=chunk_rows):
+            dates = pd.to_datetime(raw['Date'], format='%d-%b-%y', errors='coerce')
+            yield _arrays(raw, dates, _currency_columns(raw.columns))
+        return
+
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = list(next(rows))
+        currencies = _currency_columns(header)
+        for chunk in iter(lambda: list(itertools.islice(rows, chunk_rows)), []):
+            # Read-only mode leaves out trailing empty cells; blank rows are skipped as read_excel does
+            raw = pd.DataFrame([row + (None,) * (len(header) - len(row)) for row in chunk
+                                if any(cell is not None for cell in row)], columns=header)
+            yield _arrays(raw, pd.to_datetime(raw['Date'], errors='coerce'), currencies)
+    finally:
+        workbook.close()
+
+
+# A sparse column costs a row number (int32) and a value per rate; a dense one a value and a bit
+# per date. Columns filled below the break-even share are stored sparse.
+def sparse_threshold(dtype):
+    itemsize = np.dtype(dtype).itemsize
+    return (itemsize + 1 / 8) / (itemsize + 4)
+
+
+def _cache_dir_for(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, stem)
+
+
+def _write_cache(cache_dir, parsed, source_fingerprint, dtype):
+    dates, values, currencies = parsed
+    valid = ~np.isnan(values)
+    is_sparse = valid.mean(axis=0) < sparse_threshold(dtype) if len(dates) else np.zeros(len(currencies), dtype=bool)
+    dense, sparse = np.flatnonzero(~is_sparse), np.flatnonzero(is_sparse)
+
+    sparse_rows = [np.flatnonzero(valid[:, column]) for column in sparse]
+    arrays = {
+        'dates': dates,
+        'dense': dense.astype(np.int32),
+        'values': np.ascontiguousarray(np.where(valid[:, dense], values[:, dense], 0), dtype=dtype),
+        'valid': np.packbits(valid[:, dense], axis=0),
+        'sparse-columns': sparse.astype(np.int32),
+        'sparse-offsets': np.concatenate(([0], np.cumsum([len(rows) for rows in sparse_rows]))).astype(np.int64),
+        'sparse-rows': np.concatenate(sparse_rows + [np.empty(0, dtype=np.int64)]).astype(np.int32),
+        'sparse-values': np.concatenate([values[rows, column] for rows, column in zip(sparse_rows, sparse)]
+                                        + [np.empty(0)]).astype(dtype),
+    }
+
+    # Write everything under temporary names first so readers never see a half-written cache.
+    # The names are unique per writer, so concurrent builds never move each other's files.
+    for name, array in arrays.items():
+        fd, tmp = tempfile.mkstemp(prefix=f'{name}.', suffix='.tmp.npy', dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp, os.path.join(cache_dir, f'{name}.npy'))
+
+    meta = {'fingerprint': source_fingerprint, 'currencies': currencies, 'rows': int(len(dates)), 'dtype': dtype}
+    fd, tmp = tempfile.mkstemp(prefix='meta.', suffix='.tmp.json', dir=cache_dir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(cache_dir, 'meta.json'))
+
+
+def _read_cache(cache_dir, source_fingerprint, mmap_mode, dtype):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['fingerprint'] != source_fingerprint or meta['dtype'] != dtype:
+            return None
+        arrays = {name: np.load(os.path.join(cache_dir, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in ('dates', 'dense', 'values', 'valid', 'sparse-columns', 'sparse-offsets',
+                               'sparse-rows', 'sparse-values')}
+    except (OSError, ValueError, KeyError):
+        return None
+
+    rows, dense = meta['rows'], arrays['dense']
+    sparse = SparseColumns(arrays['sparse-columns'], arrays['sparse-offsets'], arrays['sparse-rows'],
+                           arrays['sparse-values'])
+    if (len(arrays['dates']) != rows or arrays['values'].shape != (rows, len(dense))
+            or arrays['valid'].shape != ((rows + 7) // 8, len(dense))
+            or len(dense) + len(sparse.columns) != len(meta['currencies'])
+            or len(sparse.offsets) != len(sparse.columns) + 1
+            or len(sparse.rows) != len(sparse.values) or len(sparse.rows) != sparse.offsets[-1]):
+        return None
+    return RateData(arrays['dates'], dense, arrays['values'], arrays['valid'], sparse, meta['currencies'])
+
+
+# Load the rate matrix for a source file, converting it to the binary cache on first use.
+# With mmap_mode='r' the arrays are memory-mapped straight from disk.
+def load_rates(path=XLSX_PATH, mmap_mode='r', dtype='float32'):
+    dtype = np.dtype(dtype).name
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported rate dtype '{dtype}', expected one of {', '.join(DTYPES)}.")
+
+    began = time.perf_counter()
+    source_fingerprint = fingerprint(path)
+    cache_dir = os.path.join(_cache_dir_for(path), dtype)
+
+    data = _read_cache(cache_dir, source_fingerprint, mmap_mode, dtype)
+    outcome = 'hit'
+    if data is None:
+        # One process builds while the others wait, e.g. gunicorn workers loading a fresh checkout
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, '.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            data = _read_cache(cache_dir, source_fingerprint, mmap_mode, dtype)
+            if data is None:
+                _write_cache(cache_dir, parse_source(path), source_fingerprint, dtype)
+                data = _read_cache(cache_dir, source_fingerprint, mmap_mode, dtype)
+                outcome = 'rebuilt'
+
+    elapsed = time.perf_counter() - began
+    metrics.load_seconds.observe(elapsed, os.path.basename(path), outcome)
+    log.debug("Loaded %s (cache %s) in %.1f ms", os.path.basename(path), outcome, elapsed * 1000)
+    return data
+
+
+if __name__ == '__main__':
+    # Pre-build the caches, e.g. as a deployment step before workers start
+    for source in (XLSX_PATH, CSV_PATH):
+        rates = load_rates(source)
+        print(f"{os.path.basename(source)}: {len(rates.dates)} rows x {len(rates.currencies)} currencies "
+              f"({len(rates.sparse.columns)} stored sparse)")
@@ -0,0 +1,158 @@
+import re
+
+import numpy as np
+
+from ratecache import XLSX_PATH, load_rates
+
+_ISO_SUFFIX = re.compile(r'\s*\(([A-Z]{3})\)\s*$')
+
+
+# ISO code from a column header such as 'U.S. dollar (USD)', or None if there isn't one
+def iso_code(column):
+    match = _ISO_SUFFIX.search(column)
+    return match.group(1) if match else None
+
+
+# Integer-coded currencies parsed from the dataset headers. Every module resolves currencies
+# through here: ids are column positions in the rate store, codes are ISO codes.
+class CurrencyRegistry:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.codes = [iso_code(column) or column for column in self.columns]
+        self.names = [_ISO_SUFFIX.sub('', column) for column in self.columns]
+        self.ids = {code: i for i, code in enumerate(self.codes)}
+        # Full headers resolve too, so 'U.S. dollar (USD)' and 'USD' are the same currency
+        self._aliases = {column: i for i, column in enumerate(self.columns)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, currency):
+        return currency in self.ids or currency in self._aliases
+
+    # Registry id for an ISO code or full column header; KeyError if unknown
+    def id(self, currency):
+        if currency in self.ids:
+            return self.ids[currency]
+        return self._aliases[currency]
+
+    def code(self, currency):
+        return self.codes[self.id(currency)]
+
+    # Display label, e.g. 'U.S. dollar (USD)'
+    def label(self, currency):
+        return self.columns[self.id(currency)]
+
+    # Dropdown options labelled with the full header and valued by ISO code
+    def options(self):
+        return [{'label': column, 'value': code} for column, code in zip(self.columns, self.codes)]
+
+
+# Compact, read-only rate matrix in the layout of the binary cache (see ratecache.RateData):
+# mostly-filled currencies in one contiguous float32 (or float64) block holding 0 where a rate is
+# missing plus a validity bitmask packed along the date axis, and sparse currencies as per-column
+# sorted (row, rate) runs. Accessors hand out float64 copies of just the requested rows/columns
+# with NaN for the missing entries.
+# Rows ingested after loading live in a small float64 tail (NaN for missing) after the base rows.
+class RateStore:
+    def __init__(self, dates, dense, values, valid_bits, sparse, registry):
+        self.dates = dates
+        self.values = values
+        self.valid_bits = valid_bits
+        self.sparse = sparse
+        self.registry = registry
+        self.base_rows = len(dates)
+        self.tail = np.empty((0, len(registry)))
+        # Position of every currency among the dense or the sparse columns, -1 in the other
+        self._dense_of = np.full(len(registry), -1, dtype=np.intp)
+        self._dense_of[np.asarray(dense, dtype=np.intp)] = np.arange(len(dense))
+        self._sparse_of = np.full(len(registry), -1, dtype=np.intp)
+        self._sparse_of[np.asarray(sparse.columns, dtype=np.intp)] = np.arange(len(sparse.columns))
+        self._all_dense = len(sparse.columns) == 0 and bool(np.all(self._dense_of == np.arange(len(registry))))
+
+    @classmethod
+    def load(cls, path=XLSX_PATH, dtype='float32'):
+        data = load_rates(path, dtype=dtype)
+        return cls(data.dates, data.dense, data.values, data.valid, data.sparse, CurrencyRegistry(data.currencies))
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def nbytes(self):
+        return (self.dates.nbytes + self.values.nbytes + self.valid_bits.nbytes + self.tail.nbytes
+                + sum(array.nbytes for array in self.sparse))
+
+    # Add new rows (dates plus a float64 matrix in registry order, NaN where missing) after the
+    # existing ones. Existing row positions never change.
+    def append(self, dates, values):
+        values = np.asarray(values, dtype=np.float64).reshape(len(dates), len(self.registry))
+        # Grow the tail before the dates so a reader never sees a date without its row
+        self.tail = np.concatenate([self.tail, values])
+        self.dates = np.concatenate([self.dates, np.asarray(dates, dtype='datetime64[ns]')])
+
+    def _rows(self, rows):
+        if rows is None:
+            return np.arange(len(self.dates))
+        if isinstance(rows, slice):
+            return np.arange(len(self.dates))[rows]
+        return np.asarray(rows, dtype=np.intp)
+
+    # Dense columns, base rows only: unpack the validity bits and mask the compact values
+    def _dense_matrix(self, rows, columns):
+        if isinstance(columns, (int, np.integer, slice)):
+            bits, values = self.valid_bits[rows // 8, columns], self.values[rows, columns]
+        else:
+            bits, values = self.valid_bits[np.ix_(rows // 8, columns)], self.values[np.ix_(rows, columns)]
+        shift = (7 - rows % 8).astype(np.uint8)
+        valid = ((bits >> (shift[:, None] if bits.ndim == 2 else shift)) & 1).astype(bool)
+        return np.where(valid, values.astype(np.float64), np.nan)
+
+    # Sparse column k, base rows only: find each row among the rows the column has rates for
+    def _sparse_column(self, rows, k):
+        lo, hi = self.sparse.offsets[k], self.sparse.offsets[k + 1]
+        stored = self.sparse.rows[lo:hi]
+        result = np.full(len(rows), np.nan)
+        if len(stored):
+            at = np.minimum(np.searchsorted(stored, rows), len(stored) - 1)
+            hit = stored[at] == rows
+            result[hit] = self.sparse.values[lo:hi][at[hit]]
+        return result
+
+    # Base rows only, dense and sparse columns alike
+    def _base_matrix(self, rows, columns):
+        if self._all_dense:
+            return self._dense_matrix(rows, columns)
+        ids = np.arange(len(self.registry))[columns]
+        if ids.ndim == 0:
+            k = self._sparse_of[ids]
+            return self._sparse_column(rows, k) if k >= 0 else self._dense_matrix(rows, int(self._dense_of[ids]))
+        result = np.empty((len(rows), len(ids)))
+        dense = self._dense_of[ids]
+        in_dense = dense >= 0
+        result[:, in_dense] = self._dense_matrix(rows, dense[in_dense])
+        for i in np.flatnonzero(~in_dense):
+            result[:, i] = self._sparse_column(rows, self._sparse_of[ids[i]])
+        return result
+
+    # Rates for the given rows (all by default) as float64, NaN where missing.
+    # columns is a single column id or a slice of them.
+    def matrix(self, rows=None, columns=slice(None)):
+        rows = self._rows(rows)
+        in_base = rows < self.base_rows
+        if in_base.all():
+            return self._base_matrix(rows, columns)
+
+        base = self._base_matrix(rows[in_base], columns)
+        result = np.empty((len(rows),) + base.shape[1:])
+        result[in_base] = base
+        result[~in_base] = self.tail[rows[~in_base] - self.base_rows, columns]
+        return result
+
+    # One currency's rates for the given rows, NaN where missing
+    def column(self, currency, rows=None):
+        return self.matrix(rows, self.registry.id(currency))
+
+    # All currencies on one row, NaN where missing
+    def row(self, row):
+        return self.matrix([row])[0]
@@ -0,0 +1,141 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from aggregates import GRANULARITIES
+
+# Report columns, one row per (pair, granularity)
+COLUMNS = ['currency_from', 'currency_to', 'granularity', 'periods', 'first_date', 'first_value',
+           'last_date', 'last_value', 'change_pct', 'min_value', 'min_date', 'max_value', 'max_date']
+
+# Set in each worker process by _init_worker
+_aggregates = None
+
+
+def _init_worker():
+    global _aggregates
+    # Forked workers inherit the memory-mapped dataset already loaded by the parent
+    from dataset import date_index, partitioned, store
+    if partitioned is not None:
+        from aggregates import WindowedAggregates
+        _aggregates = WindowedAggregates(partitioned)
+    else:
+        from aggregates import AggregateIndex
+        _aggregates = AggregateIndex(store, date_index, cache_size=len(store.registry))
+
+
+# Report rows for one base currency against every other one, computed with the same
+# aggregates as the converter chart (update_output)
+def report_rows(currency_from, currencies, start, end, granularities):
+    rows = []
+    for currency_to in currencies:
+        if currency_to == currency_from:
+            continue
+        for granularity in granularities:
+            aggregate = _aggregates.query(currency_from, currency_to, start, end, granularity)
+            row = dict.fromkeys(COLUMNS)
+            row.update(currency_from=currency_from, currency_to=currency_to, granularity=granularity, periods=0)
+            if aggregate is not None and aggregate.min_date is not None:
+                present = np.flatnonzero(~np.isnan(aggregate.means))
+                first, last = present[0], present[-1]
+                row.update(periods=len(present),
+                           first_date=aggregate.labels[first], first_value=aggregate.means[first],
+                           last_date=aggregate.labels[last], last_value=aggregate.means[last],
+                           change_pct=(aggregate.means[last] / aggregate.means[first] - 1) * 100,
+                           min_value=aggregate.min_value, min_date=aggregate.min_date,
+                           max_value=aggregate.max_value, max_date=aggregate.max_date)
+            rows.append(row)
+    return rows
+
+
+def _frame(rows):
+    frame = pd.DataFrame(rows, columns=COLUMNS)
+    for column in ('first_date', 'last_date', 'min_date', 'max_date'):
+        frame[column] = pd.to_datetime(frame[column])
+    return frame
+
+
+# Writes report chunks as they arrive: CSV by default, Parquet for a .parquet path
+class ReportWriter:
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.lower().endswith('.parquet')
+        self._writer = None
+        self._header = True
+        if self.parquet:
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise SystemExit("Writing Parquet needs pyarrow (pip install pyarrow), or use a .csv path.")
+            self._pyarrow = pyarrow
+
+    def write(self, frame):
+        if self.parquet:
+            table = self._pyarrow.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = self._pyarrow.parquet.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='w' if self._header else 'a', header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+# Compute every pair x granularity over a process pool, one task per base currency,
+# streaming each finished task to the output. Returns the number of rows written.
+def run(output, currencies, start=None, end=None, granularities=GRANULARITIES, workers=None, progress=sys.stderr):
+    writer = ReportWriter(output)
+    pairs_total = len(currencies) * (len(currencies) - 1)
+    pairs_done = rows_written = 0
+    began = time.monotonic()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            tasks = [pool.submit(report_rows, currency, currencies, start, end, granularities)
+                     for currency in currencies]
+            for task in as_completed(tasks):
+                rows = task.result()
+                writer.write(_frame(rows))
+                rows_written += len(rows)
+                pairs_done += len(rows) // len(granularities)
+
+                elapsed = time.monotonic() - began
+                rate = pairs_done / elapsed if elapsed else 0.0
+                remaining = (pairs_total - pairs_done) / rate if rate else 0.0
+                print(f"\r{pairs_done}/{pairs_total} pairs  {rate:,.0f} pairs/s  ETA {remaining:,.0f}s",
+                      end='', file=progress, flush=True)
+    finally:
+        writer.close()
+
+    elapsed = time.monotonic() - began
+    print(f"\nWrote {rows_written} rows for {pairs_done} pairs to {output} in {elapsed:.1f}s "
+          f"({pairs_done / elapsed if elapsed else 0.0:,.0f} pairs/s)", file=progress)
+    return rows_written
+
+
+# Nightly appreciation/depreciation report over every currency pair:
+#   python report.py report.csv [--start 2020-01-01] [--end 2022-12-31] [--granularity W M] [--workers 8]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batch appreciation/depreciation report over currency pairs.')
+    parser.add_argument('output', help='.csv or .parquet file to write')
+    parser.add_argument('--start', help='first date (default: start of the data)')
+    parser.add_argument('--end', help='last date (default: end of the data)')
+    parser.add_argument('--granularity', nargs='+', choices=GRANULARITIES, default=list(GRANULARITIES))
+    parser.add_argument('--currencies', nargs='+', help='ISO codes to include (default: all)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    from dataset import partitioned, registry
+    available = (partitioned.registry if partitioned is not None else registry).codes
+    unknown = sorted(set(args.currencies or ()) - set(available))
+    if unknown:
+        parser.error(f"unknown currencies: {', '.join(unknown)}")
+    run(args.output, args.currencies or available, args.start, args.end, args.granularity, args.workers)
@@ -0,0 +1,168 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from lrucache import LRUCache
+
+# Rolling windows offered in the UI, in trading days
+WINDOWS = {5: '1 Week', 21: '1 Month', 63: '1 Quarter'}
+DEFAULT_WINDOW = 21
+TRADING_DAYS = 252
+
+# Annualized volatility thresholds between Low/Medium and Medium/High risk
+DEFAULT_THRESHOLDS = (0.05, 0.10)
+RISK_LEVELS = np.array(['Low Risk', 'Medium Risk', 'High Risk'])
+RISK_COLORS = np.array(['green', 'orange', 'red'])
+
+# Rolling volatility of a pair aligned with the date index: one entry per sorted date,
+# NaN (risk code -1) where there is no full window of returns. returns and last_log_cross
+# (the latest observed log cross rate) are kept so the series can be extended with new dates.
+VolatilitySeries = namedtuple('VolatilitySeries', ['volatility', 'risk', 'returns', 'last_log_cross'])
+
+
+def _log_cross(rates1, rates2):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_cross = np.log(rates2 / rates1)
+    log_cross[~np.isfinite(log_cross)] = np.nan
+    return log_cross
+
+
+# Log returns of a log cross rate series, each taken against the previous observed value.
+# previous is the last observed value before the series (NaN if there is none).
+def _returns(log_cross, previous=np.nan):
+    levels = np.concatenate(([previous], log_cross))
+    valid = np.flatnonzero(~np.isnan(levels))
+    returns = np.full(len(levels), np.nan)
+    returns[valid[1:]] = np.diff(levels[valid])
+    return returns[1:]
+
+
+# Log returns of the cross rate (units of currency2 per currency1), aligned with the input rows.
+# Each return is taken against the previous row where both rates were present.
+def pair_log_returns(rates1, rates2):
+    return _returns(_log_cross(rates1, rates2))
+
+
+# Annualized rolling standard deviation of returns over `window` observations, aligned with the
+# input. Missing returns are skipped, so a window always holds `window` actual observations.
+def rolling_volatility(returns, window):
+    observed = np.flatnonzero(~np.isnan(returns))
+    volatility = np.full(len(returns), np.nan)
+    if len(observed) >= window > 1:
+        std = sliding_window_view(returns[observed], window).std(axis=1, ddof=1)
+        volatility[observed[window - 1:]] = std * np.sqrt(TRADING_DAYS)
+    return volatility
+
+
+# Risk code per entry: 0 low, 1 medium, 2 high, -1 where volatility is missing
+def classify_risk(volatility, thresholds=DEFAULT_THRESHOLDS):
+    risk = np.digitize(volatility, thresholds, right=True)
+    risk[np.isnan(volatility)] = -1
+    return risk
+
+
+# Rolling volatility per (pair, window), cached so a date-range change only re-slices
+class VolatilityEngine:
+    def __init__(self, rate_store, date_index, thresholds=DEFAULT_THRESHOLDS, cache_size=64):
+        self.store = rate_store
+        self.date_index = date_index
+        self.thresholds = tuple(thresholds)
+        self.cache = LRUCache(cache_size)
+
+    # Series of the pair covering at least the dates of `index` (default: the current index)
+    def series(self, currency1, currency2, window=DEFAULT_WINDOW, index=None):
+        index = self.date_index.snapshot() if index is None else index
+        key = (self.store.registry.code(currency1), self.store.registry.code(currency2), window)
+        series = self.cache.get_or_compute(key, lambda: self._build(*key, index))
+        # Built from an older index while rows were being added, so extend() passed it over
+        if len(series.volatility) < len(index):
+            series = self._build(*key, index)
+            self.cache.put(key, series)
+        return series
+
+    def _log_cross(self, currency1, currency2, rows):
+        return _log_cross(self.store.column(currency1, rows), self.store.column(currency2, rows))
+
+    def _series(self, volatility, returns, log_cross, previous=np.nan):
+        observed = log_cross[~np.isnan(log_cross)]
+        last_log_cross = observed[-1] if len(observed) else previous
+        return VolatilitySeries(volatility, classify_risk(volatility, self.thresholds), returns, last_log_cross)
+
+    def _build(self, currency1, currency2, window, index):
+        log_cross = self._log_cross(currency1, currency2, index.rows)
+        returns = _returns(log_cross)
+        return self._series(rolling_volatility(returns, window), returns, log_cross)
+
+    # dataset.on_append listener: extend the cached series by the dates added from first_position
+    # on. Only the windows ending on a new date are computed.
+    def extend(self, first_position, in_order):
+        if not in_order:
+            self.cache.clear()
+            return
+        rows = self.date_index.rows[first_position:]
+        for (currency1, currency2, window), series in self.cache.items():
+            # Series built after the rows arrived already cover them
+            if len(series.volatility) != first_position:
+                continue
+            log_cross = self._log_cross(currency1, currency2, rows)
+            returns = np.concatenate((series.returns, _returns(log_cross, series.last_log_cross)))
+
+            # New windows need the window - 1 observed returns before the first new one
+            observed = np.flatnonzero(~np.isnan(returns))
+            tail = observed[max(0, np.searchsorted(observed, first_position) - (window - 1)):]
+            tail_volatility = np.full(len(returns), np.nan)
+            tail_volatility[tail] = rolling_volatility(returns[tail], window)
+            volatility = np.concatenate((series.volatility, tail_volatility[first_position:]))
+
+            self.cache.put((currency1, currency2, window),
+                           self._series(volatility, returns, log_cross, series.last_log_cross))
+
+    # Dates, volatility and risk codes within [start, end], leaving out dates without a value
+    def query(self, currency1, currency2, start, end, window=DEFAULT_WINDOW):
+        index = self.date_index.snapshot()
+        i, j = index.range_positions(start, end)
+        series = self.series(currency1, currency2, window, index)
+        keep = i + np.flatnonzero(series.risk[i:j] >= 0)
+        return index.dates[keep], series.volatility[keep], series.risk[keep]
+
+
+# Same queries answered from a partitioned store. Only the partitions overlapping the range,
+# plus enough history before it to fill the first windows, are read.
+class WindowedVolatility:
+    def __init__(self, partitioned_store, thresholds=DEFAULT_THRESHOLDS):
+        self.store = partitioned_store
+        self.thresholds = tuple(thresholds)
+
+    # Rates of the pair before start, reading back one partition at a time until they hold
+    # `window` observed returns, so the first windows in range match VolatilityEngine's
+    def _history(self, columns, start, window):
+        before = pd.Timestamp(start).normalize() - pd.Timedelta(days=1)
+        dates, values, observed = [], [], 0
+        for key in reversed(self.store.partitions_for(None, before)):
+            partition = self.store.partitions[key]
+            partition_dates, partition_values = self.store.read(partition['first'],
+                                                                min(before, pd.Timestamp(partition['last'])), columns)
+            dates.insert(0, partition_dates)
+            values.insert(0, partition_values)
+            observed += int(np.count_nonzero(~np.isnan(_log_cross(partition_values[:, 0], partition_values[:, 1]))))
+            # window returns need window + 1 observed levels
+            if observed > window:
+                break
+        return dates, values
+
+    def query(self, currency1, currency2, start, end, window=DEFAULT_WINDOW):
+        columns = [currency1, currency2]
+        dates, values = self.store.read(start, end, columns)
+        if start is not None:
+            history_dates, history_values = self._history(columns, start, window)
+            dates = np.concatenate(history_dates + [dates])
+            values = np.concatenate(history_values + [values])
+        volatility = rolling_volatility(pair_log_returns(values[:, 0], values[:, 1]), window)
+        risk = classify_risk(volatility, self.thresholds)
+
+        keep = risk >= 0
+        if start is not None:
+            keep &= dates >= pd.Timestamp(start).normalize().to_datetime64()
+        return dates[keep], volatility[keep], risk[keep]